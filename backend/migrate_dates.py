@@ -0,0 +1,115 @@
+"""Rewrite ISO-string dates stored by older releases as native BSON datetimes.
+
+The migration works in batches ordered by _id and only touches documents that
+still hold a string in one of the date fields, so it can be stopped and re-run
+at any point and will pick up where it left off. The server also runs it at
+startup, so this script is only needed to migrate ahead of a deploy.
+
+    python migrate_dates.py [--batch-size 1000] [--dry-run]
+"""
+from dotenv import load_dotenv
+from pymongo import MongoClient, UpdateOne
+from pathlib import Path
+from datetime import datetime, timezone
+import argparse
+import logging
+import os
+
+
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+
+# Date fields per collection that were stored as ISO strings
+DATE_FIELDS = {
+    "customers": ["created_at"],
+    "services": ["created_at"],
+    "bookings": ["created_at", "updated_at", "estimated_delivery_date", "actual_delivery_date"],
+    "import_jobs": ["created_at", "started_at", "finished_at"],
+}
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+def parse_date(value):
+    """Parse an ISO string the way the old read path did, assuming UTC when no offset is given"""
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+
+def string_date_filter(fields, after_id=None):
+    """Documents still holding a string in one of `fields`, after `after_id` in _id order"""
+    string_filter = {"$or": [{field: {"$type": "string"}} for field in fields]}
+    if after_id is None:
+        return string_filter
+    return {"$and": [string_filter, {"_id": {"$gt": after_id}}]}
+
+
+def date_updates(collection_name, batch, fields):
+    """UpdateOne operations converting one batch, and how many documents had nothing parseable"""
+    operations = []
+    skipped = 0
+    for doc in batch:
+        update = {}
+        for field in fields:
+            value = doc.get(field)
+            if not isinstance(value, str):
+                continue
+            try:
+                update[field] = parse_date(value)
+            except ValueError:
+                logger.warning(f"{collection_name} {doc['_id']}: cannot parse {field}={value!r}")
+        if update:
+            # Only overwrite fields that are still strings, in case the app wrote them meanwhile
+            match = {"_id": doc["_id"], **{field: {"$type": "string"} for field in update}}
+            operations.append(UpdateOne(match, {"$set": update}))
+        else:
+            skipped += 1
+    return operations, skipped
+
+
+def migrate_collection(collection, fields, batch_size, dry_run=False):
+    """Convert string dates in one collection, returning (migrated, skipped) counts"""
+    projection = {field: 1 for field in fields}
+    migrated = 0
+    skipped = 0
+    last_id = None
+
+    while True:
+        batch = list(collection.find(string_date_filter(fields, last_id), projection).sort("_id", 1).limit(batch_size))
+        if not batch:
+            break
+        last_id = batch[-1]["_id"]
+
+        operations, batch_skipped = date_updates(collection.name, batch, fields)
+        skipped += batch_skipped
+        if operations and not dry_run:
+            collection.bulk_write(operations, ordered=False)
+        migrated += len(operations)
+        logger.info(f"{collection.name}: {migrated} migrated, {skipped} skipped")
+
+    return migrated, skipped
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert ISO-string dates to native BSON datetimes")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--dry-run", action="store_true", help="report what would change without writing")
+    args = parser.parse_args()
+
+    client = MongoClient(os.environ['MONGO_URL'], tz_aware=True)
+    db = client[os.environ['DB_NAME']]
+    try:
+        for collection_name, fields in DATE_FIELDS.items():
+            migrate_collection(db[collection_name], fields, args.batch_size, args.dry_run)
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,27 +1,165 @@
-from fastapi import FastAPI, APIRouter, UploadFile, File, HTTPException, Query
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, APIRouter, UploadFile, File, HTTPException, Query, Response, Header, Depends
+from fastapi.responses import JSONResponse, ORJSONResponse, PlainTextResponse, StreamingResponse
+from fastapi.encoders import jsonable_encoder
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING, IndexModel, ReturnDocument, UpdateOne, monitoring
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
 import os
+import re
+import time
+import asyncio
 import logging
+import threading
+from collections import defaultdict
+from contextvars import ContextVar
 from pathlib import Path
 from pydantic import BaseModel, Field
 from typing import List, Optional
 import uuid
-from datetime import datetime, timezone
+from datetime import date, datetime, timedelta, timezone
+import numpy as np
 import pandas as pd
+from openpyxl import Workbook, load_workbook
+from concurrent.futures import ThreadPoolExecutor
 import io
 import csv
+import json
+import base64
+import hashlib
+import orjson
+import tempfile
+from functools import lru_cache
 from enum import Enum
+from migrate_dates import DATE_FIELDS, date_updates, string_date_filter
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet export is optional
+    pa = None
+    pq = None
 
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
+# Performance instrumentation
+REQUEST_DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Requests slower than this many milliseconds are logged with their Mongo command breakdown
+SLOW_REQUEST_MS = float(os.environ.get('SLOW_REQUEST_MS', '0'))
+
+# Mongo commands issued while serving the current request, as (command name, seconds)
+current_request_commands = ContextVar("current_request_commands", default=None)
+
+def prometheus_labels(**labels):
+    """Format label pairs, escaping values as the Prometheus text format requires"""
+    pairs = []
+    for name, value in labels.items():
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+class MetricsRegistry:
+    """Process-wide request and Mongo command metrics, rendered in the Prometheus text format"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self.requests = defaultdict(int)
+        self.request_buckets = defaultdict(lambda: [0] * len(buckets))
+        self.request_seconds = defaultdict(float)
+        self.request_count = defaultdict(int)
+        self.request_commands = defaultdict(int)
+        self.request_command_seconds = defaultdict(float)
+        self.commands = defaultdict(int)
+        self.command_seconds = defaultdict(float)
+
+    def observe_request(self, method, route, status, seconds, commands):
+        key = (method, route)
+        with self._lock:
+            self.requests[(method, route, status)] += 1
+            self.request_count[key] += 1
+            self.request_seconds[key] += seconds
+            counts = self.request_buckets[key]
+            for position, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    counts[position] += 1
+            self.request_commands[key] += len(commands)
+            self.request_command_seconds[key] += sum(duration for _, duration in commands)
+
+    def observe_command(self, name, seconds):
+        with self._lock:
+            self.commands[name] += 1
+            self.command_seconds[name] += seconds
+
+    def render(self):
+        lines = []
+        with self._lock:
+            lines.append("# HELP http_requests_total HTTP requests by route and status code.")
+            lines.append("# TYPE http_requests_total counter")
+            for (method, route, status), count in sorted(self.requests.items()):
+                lines.append(f"http_requests_total{prometheus_labels(method=method, route=route, status=status)} {count}")
+
+            lines.append("# HELP http_request_duration_seconds Time to produce the response headers.")
+            lines.append("# TYPE http_request_duration_seconds histogram")
+            for (method, route), counts in sorted(self.request_buckets.items()):
+                for bound, count in zip(self.buckets, counts):
+                    labels = prometheus_labels(method=method, route=route, le=bound)
+                    lines.append(f"http_request_duration_seconds_bucket{labels} {count}")
+                labels = prometheus_labels(method=method, route=route, le="+Inf")
+                lines.append(f"http_request_duration_seconds_bucket{labels} {self.request_count[(method, route)]}")
+                labels = prometheus_labels(method=method, route=route)
+                lines.append(f"http_request_duration_seconds_sum{labels} {self.request_seconds[(method, route)]}")
+                lines.append(f"http_request_duration_seconds_count{labels} {self.request_count[(method, route)]}")
+
+            lines.append("# HELP http_request_mongo_commands_total Mongo commands issued while serving each route.")
+            lines.append("# TYPE http_request_mongo_commands_total counter")
+            for (method, route), count in sorted(self.request_commands.items()):
+                lines.append(f"http_request_mongo_commands_total{prometheus_labels(method=method, route=route)} {count}")
+
+            lines.append("# HELP http_request_mongo_seconds_total Time spent in Mongo commands while serving each route.")
+            lines.append("# TYPE http_request_mongo_seconds_total counter")
+            for (method, route), seconds in sorted(self.request_command_seconds.items()):
+                lines.append(f"http_request_mongo_seconds_total{prometheus_labels(method=method, route=route)} {seconds}")
+
+            lines.append("# HELP mongo_commands_total Mongo commands by command name, including background work.")
+            lines.append("# TYPE mongo_commands_total counter")
+            for name, count in sorted(self.commands.items()):
+                lines.append(f"mongo_commands_total{prometheus_labels(command=name)} {count}")
+
+            lines.append("# HELP mongo_command_seconds_total Time spent in Mongo commands by command name.")
+            lines.append("# TYPE mongo_command_seconds_total counter")
+            for name, seconds in sorted(self.command_seconds.items()):
+                lines.append(f"mongo_command_seconds_total{prometheus_labels(command=name)} {seconds}")
+        return "\n".join(lines) + "\n"
+
+metrics = MetricsRegistry(REQUEST_DURATION_BUCKETS)
+
+class MongoCommandRecorder(monitoring.CommandListener):
+    """Attribute every Mongo command to the request that issued it"""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        self._record(event)
+
+    def failed(self, event):
+        self._record(event)
+
+    def _record(self, event):
+        seconds = event.duration_micros / 1_000_000
+        metrics.observe_command(event.command_name, seconds)
+        # Motor copies the caller's context onto its executor threads, so this is the request's list
+        commands = current_request_commands.get()
+        if commands is not None:
+            commands.append((event.command_name, seconds))
+
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+client = AsyncIOMotorClient(mongo_url, tz_aware=True, event_listeners=[MongoCommandRecorder()])
 db = client[os.environ['DB_NAME']]
 
 # Create the main app without a prefix
@@ -30,12 +168,207 @@ app = FastAPI()
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
 
+# Pagination settings for the list endpoints
+DEFAULT_PAGE_SIZE = 1000
+MAX_PAGE_SIZE = 1000
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+# Related documents GET /api/bookings?expand= can attach, and the booking field referencing each
+BOOKING_EXPANSIONS = {"customer": "customer_id", "service": "service_id"}
+
+# Result sizes for GET /api/customers/search
+DEFAULT_SEARCH_LIMIT = 20
+MAX_SEARCH_LIMIT = 100
+
+# Largest number of lines priced by one POST /api/quotes call
+MAX_QUOTE_LINES = 10000
+
+# Largest number of bookings accepted by one POST /api/bookings/batch call
+MAX_BOOKING_BATCH_SIZE = 1000
+
+# Largest number of status changes accepted by one bulk status update
+MAX_STATUS_UPDATE_BATCH_SIZE = 5000
+
+# Live booking feed: events buffered per SSE client before it is told to reload, and how
+# often an idle stream sends a comment to keep proxies from closing it
+BOOKING_EVENT_QUEUE_SIZE = 1000
+SSE_KEEPALIVE_SECONDS = 15
+
+# Bookings exports read the cursor in batches of this size; spooled XLSX/Parquet
+# files move from memory to disk once they pass EXPORT_SPOOL_MAX_BYTES
+EXPORT_BATCH_SIZE = 1000
+EXPORT_SPOOL_MAX_BYTES = 16 * 1024 * 1024
+# A worksheet holds 1,048,576 rows, so larger XLSX exports continue on further sheets
+XLSX_MAX_DATA_ROWS = 1048575
+# Export columns in file order with their Parquet type; pyarrow is optional, so the types are
+# named here and resolved by export_arrow_schema
+EXPORT_COLUMN_TYPES = {
+    "id": "string",
+    "customer_id": "string",
+    "service_id": "string",
+    "quantity": "int64",
+    "total_price": "float64",
+    "status": "string",
+    "notes": "string",
+    "external_ref": "string",
+    "estimated_delivery_date": "timestamp",
+    "actual_delivery_date": "timestamp",
+    "delivery_variance_days": "int64",
+    "delivered_on_time": "bool",
+    "created_at": "timestamp",
+    "updated_at": "timestamp",
+}
+EXPORT_COLUMNS = list(EXPORT_COLUMN_TYPES)
+
+# Number of file rows resolved and written per database round trip during bulk import
+IMPORT_CHUNK_SIZE = 1000
+
+# Uploads are fingerprinted by content hash so a retried file returns the stored result
+# instead of importing again; fingerprints expire after IMPORT_FINGERPRINT_TTL_DAYS
+IMPORT_FINGERPRINT_TTL_DAYS = int(os.environ.get('IMPORT_FINGERPRINT_TTL_DAYS', '30'))
+
+# An unfinished claim is renewed as its import makes progress; one not renewed within the lease
+# belongs to an import that died with its process and may be claimed again
+IMPORT_CLAIM_LEASE_SECONDS = int(os.environ.get('IMPORT_CLAIM_LEASE_SECONDS', '900'))
+
+# Row errors kept with a stored import result or import job, so one bad file cannot outgrow a document
+MAX_STORED_IMPORT_ERRORS = 1000
+
+# Background import jobs: how many run at once per process and how many may wait
+MAX_CONCURRENT_IMPORT_JOBS = int(os.environ.get('MAX_CONCURRENT_IMPORT_JOBS', '2'))
+MAX_QUEUED_IMPORT_JOBS = int(os.environ.get('MAX_QUEUED_IMPORT_JOBS', '10'))
+import_job_slots = asyncio.Semaphore(MAX_CONCURRENT_IMPORT_JOBS)
+import_job_tasks = set()
+
+# Upload files are parsed on these threads so the event loop keeps serving other requests
+UPLOAD_PARSER_THREADS = int(os.environ.get('UPLOAD_PARSER_THREADS', '2'))
+upload_parse_executor = ThreadPoolExecutor(max_workers=UPLOAD_PARSER_THREADS, thread_name_prefix="upload-parser")
+
+# How long the in-process service catalog is trusted before it is reloaded
+SERVICE_CATALOG_TTL_SECONDS = float(os.environ.get('SERVICE_CATALOG_TTL_SECONDS', '60'))
+
+# Delivery estimates count working days: the weekly working days (numpy weekmask syntax)
+# plus the delivery_holidays table, which is reloaded after DELIVERY_CALENDAR_TTL_SECONDS
+DELIVERY_WORKING_DAYS = os.environ.get('DELIVERY_WORKING_DAYS', 'Mon Tue Wed Thu Fri')
+DELIVERY_CALENDAR_TTL_SECONDS = float(os.environ.get('DELIVERY_CALENDAR_TTL_SECONDS', '300'))
+
+# Indexes backing every lookup, filter and sort issued by the endpoints below
+INDEXES = {
+    "customers": [
+        IndexModel([("id", ASCENDING)], unique=True, name="id_unique"),
+        IndexModel([("email", ASCENDING)], unique=True, name="email_unique"),
+        IndexModel([("created_at", ASCENDING), ("id", ASCENDING)], name="created_at_id"),
+        IndexModel([("name_lower", ASCENDING), ("id", ASCENDING)], name="name_lower_id"),
+        IndexModel([("email_lower", ASCENDING), ("id", ASCENDING)], name="email_lower_id"),
+    ],
+    "services": [
+        IndexModel([("id", ASCENDING)], unique=True, name="id_unique"),
+        IndexModel([("name", ASCENDING)], name="name"),
+        IndexModel([("created_at", ASCENDING), ("id", ASCENDING)], name="created_at_id"),
+    ],
+    "bookings": [
+        IndexModel([("id", ASCENDING)], unique=True, name="id_unique"),
+        IndexModel([("created_at", ASCENDING), ("id", ASCENDING)], name="created_at_id"),
+        IndexModel([("status", ASCENDING), ("created_at", ASCENDING), ("id", ASCENDING)], name="status_created_at_id"),
+        IndexModel([("customer_id", ASCENDING), ("created_at", ASCENDING), ("id", ASCENDING)], name="customer_id_created_at_id"),
+        IndexModel([("service_id", ASCENDING), ("created_at", ASCENDING), ("id", ASCENDING)], name="service_id_created_at_id"),
+        IndexModel([("estimated_delivery_date", ASCENDING), ("id", ASCENDING)], name="estimated_delivery_date_id"),
+        IndexModel(
+            [("status", ASCENDING), ("estimated_delivery_date", ASCENDING), ("id", ASCENDING)],
+            name="status_estimated_delivery_date_id"
+        ),
+        IndexModel(
+            [("customer_id", ASCENDING), ("estimated_delivery_date", ASCENDING), ("id", ASCENDING)],
+            name="customer_id_estimated_delivery_date_id"
+        ),
+        IndexModel(
+            [("service_id", ASCENDING), ("estimated_delivery_date", ASCENDING), ("id", ASCENDING)],
+            name="service_id_estimated_delivery_date_id"
+        ),
+        IndexModel([("status", ASCENDING), ("delivered_on_time", ASCENDING)], name="status_delivered_on_time"),
+        IndexModel([("status", ASCENDING), ("actual_delivery_date", ASCENDING)], name="status_actual_delivery_date"),
+        IndexModel(
+            [("external_ref", ASCENDING)], unique=True, name="external_ref_unique",
+            partialFilterExpression={"external_ref": {"$type": "string"}}
+        ),
+    ],
+    "import_jobs": [
+        IndexModel([("id", ASCENDING)], unique=True, name="id_unique"),
+    ],
+    "delivery_holidays": [
+        IndexModel([("date", ASCENDING)], unique=True, name="date_unique"),
+    ],
+    "import_fingerprints": [
+        IndexModel([("fingerprint", ASCENDING)], unique=True, name="fingerprint_unique"),
+        IndexModel(
+            [("created_at", ASCENDING)], name="created_at_ttl",
+            expireAfterSeconds=IMPORT_FINGERPRINT_TTL_DAYS * 24 * 3600
+        ),
+    ],
+}
+
+# Single document holding the incrementally maintained dashboard counters
+OVERVIEW_ROLLUP_ID = "overview"
+
+# Hot query shapes checked by the index health report: (collection, label, filter, sort)
+HOT_QUERIES = [
+    ("customers", "find by id", {"id": ""}, None),
+    ("customers", "find by email", {"email": ""}, None),
+    ("customers", "list page", {}, [("created_at", 1), ("id", 1)]),
+    ("customers", "search by name prefix", {"name_lower": {"$regex": "^a"}}, [("name_lower", 1), ("id", 1)]),
+    ("customers", "search by email prefix", {"email_lower": {"$regex": "^a"}}, [("email_lower", 1), ("id", 1)]),
+    ("services", "find by id", {"id": ""}, None),
+    ("services", "find by name", {"name": ""}, None),
+    ("services", "list page", {}, [("created_at", 1), ("id", 1)]),
+    ("bookings", "find by id", {"id": ""}, None),
+    ("bookings", "list page", {}, [("created_at", 1), ("id", 1)]),
+    ("bookings", "list page by status", {"status": "pending"}, [("created_at", 1), ("id", 1)]),
+    ("bookings", "list page by customer", {"customer_id": ""}, [("created_at", -1), ("id", -1)]),
+    ("bookings", "list page by service", {"service_id": ""}, [("created_at", 1), ("id", 1)]),
+    ("bookings", "created range", {"created_at": {"$gte": datetime(2000, 1, 1, tzinfo=timezone.utc)}}, [("created_at", 1), ("id", 1)]),
+    ("bookings", "by estimated delivery", {"estimated_delivery_date": {"$gte": datetime(2000, 1, 1, tzinfo=timezone.utc)}},
+     [("estimated_delivery_date", 1), ("id", 1)]),
+    ("bookings", "status by estimated delivery", {"status": "pending"}, [("estimated_delivery_date", 1), ("id", 1)]),
+    ("bookings", "customer by estimated delivery", {"customer_id": ""}, [("estimated_delivery_date", 1), ("id", 1)]),
+    ("bookings", "service by estimated delivery", {"service_id": ""}, [("estimated_delivery_date", 1), ("id", 1)]),
+    ("bookings", "customer created range", {"customer_id": "", "created_at": {"$gte": datetime(2000, 1, 1, tzinfo=timezone.utc)}},
+     [("created_at", 1), ("id", 1)]),
+    ("bookings", "status estimated delivery range",
+     {"status": "pending", "estimated_delivery_date": {"$gte": datetime(2000, 1, 1, tzinfo=timezone.utc)}},
+     [("estimated_delivery_date", 1), ("id", 1)]),
+    ("bookings", "on-time delivery stats", {"status": "delivered", "delivered_on_time": {"$exists": True}}, None),
+    ("bookings", "delivered bookings", {"status": "delivered", "actual_delivery_date": {"$exists": True}}, None),
+    ("bookings", "timeseries range", {"created_at": {"$gte": datetime(2000, 1, 1, tzinfo=timezone.utc)}}, None),
+]
+
 # Enums
 class ServiceType(str, Enum):
     LOGISTICS = "logistics"
     TRANSPORTATION = "transportation"  
     CONSULTING = "consulting"
 
+class ImportJobStatus(str, Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+class ExportFormat(str, Enum):
+    CSV = "csv"
+    XLSX = "xlsx"
+    PARQUET = "parquet"
+
+class TimeBucket(str, Enum):
+    DAY = "day"
+    WEEK = "week"
+    MONTH = "month"
+
+class BookingSort(str, Enum):
+    CREATED_AT = "created_at"
+    CREATED_AT_DESC = "-created_at"
+    ESTIMATED_DELIVERY_DATE = "estimated_delivery_date"
+    ESTIMATED_DELIVERY_DATE_DESC = "-estimated_delivery_date"
+
 class BookingStatus(str, Enum):
     PENDING = "pending"
     CONFIRMED = "confirmed"
@@ -58,6 +391,19 @@ class CustomerCreate(BaseModel):
     phone: Optional[str] = None
     address: Optional[str] = None
 
+class PricingTier(BaseModel):
+    min_quantity: int = Field(ge=1)
+    unit_price: float = Field(ge=0)
+
+class CustomerDiscount(BaseModel):
+    customer_id: str
+    percent: float = Field(ge=0, le=100)
+
+class PricingRules(BaseModel):
+    # Volume tiers price the whole quantity at the unit price of the highest tier reached
+    tiers: List[PricingTier] = []
+    customer_discounts: List[CustomerDiscount] = []
+
 class Service(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     name: str
@@ -65,6 +411,7 @@ class Service(BaseModel):
     description: Optional[str] = None
     base_price: float
     estimated_delivery_days: int
+    pricing: Optional[PricingRules] = None
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 class ServiceCreate(BaseModel):
@@ -73,6 +420,7 @@ class ServiceCreate(BaseModel):
     description: Optional[str] = None
     base_price: float
     estimated_delivery_days: int
+    pricing: Optional[PricingRules] = None
 
 class Booking(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -84,6 +432,8 @@ class Booking(BaseModel):
     estimated_delivery_date: datetime
     actual_delivery_date: Optional[datetime] = None
     notes: Optional[str] = None
+    external_ref: Optional[str] = None
+    version: int = 0
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
@@ -92,11 +442,39 @@ class BookingCreate(BaseModel):
     service_id: str
     quantity: int = 1
     notes: Optional[str] = None
+    external_ref: Optional[str] = None
+
+class BookingBatchItemResult(BaseModel):
+    index: int
+    booking: Optional[Booking] = None
+    error: Optional[str] = None
+
+class BookingBatchResult(BaseModel):
+    successful: int
+    failed: int
+    results: List[BookingBatchItemResult]
 
 class BookingUpdate(BaseModel):
     status: Optional[BookingStatus] = None
     actual_delivery_date: Optional[datetime] = None
     notes: Optional[str] = None
+    # Expected current version; the update is rejected if the booking has moved on
+    version: Optional[int] = None
+
+class BookingStatusUpdate(BaseModel):
+    booking_id: str
+    status: BookingStatus
+    actual_delivery_date: Optional[datetime] = None
+
+class BookingStatusUpdateResult(BaseModel):
+    booking_id: str
+    updated: bool = False
+    error: Optional[str] = None
+
+class BookingStatusUpdateBatchResult(BaseModel):
+    successful: int
+    failed: int
+    results: List[BookingStatusUpdateResult]
 
 class DeliveryPerformance(BaseModel):
     booking_id: str
@@ -105,32 +483,1117 @@ class DeliveryPerformance(BaseModel):
     variance_days: Optional[int] = None
     on_time: Optional[bool] = None
 
+class DeliveryPerformanceSummary(BaseModel):
+    total_deliveries: int = 0
+    on_time_deliveries: int = 0
+    on_time_rate: float = 0
+    average_actual_days: float = 0
+    average_variance_days: float = 0
+
+class DeliveryPerformanceReport(BaseModel):
+    summary: DeliveryPerformanceSummary
+    deliveries: List[DeliveryPerformance]
+    next_cursor: Optional[str] = None
+
+class QuoteLine(BaseModel):
+    service_id: str
+    quantity: int = Field(1, ge=1)
+    customer_id: Optional[str] = None
+
+class QuoteLineResult(BaseModel):
+    index: int
+    service_id: str
+    quantity: int
+    customer_id: Optional[str] = None
+    unit_price: Optional[float] = None
+    discount_percent: float = 0
+    total_price: Optional[float] = None
+    error: Optional[str] = None
+
+class QuoteResult(BaseModel):
+    total_price: float
+    successful: int
+    failed: int
+    lines: List[QuoteLineResult]
+
+class Holiday(BaseModel):
+    day: date
+    name: Optional[str] = None
+
+class TimeseriesPoint(BaseModel):
+    bucket: datetime
+    service_id: Optional[str] = None
+    bookings: int
+    revenue: float
+    delivered: int
+    on_time_delivery_rate: Optional[float] = None
+
 class FileUploadResult(BaseModel):
     filename: str
     records_processed: int
     successful_imports: int
     failed_imports: int
+    skipped_duplicates: int = 0
     errors: List[str] = []
 
+class ImportJob(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    filename: str
+    status: ImportJobStatus = ImportJobStatus.QUEUED
+    total_records: Optional[int] = None
+    records_processed: int = 0
+    successful_imports: int = 0
+    failed_imports: int = 0
+    skipped_duplicates: int = 0
+    rows_per_second: float = 0
+    errors: List[str] = []
+    error: Optional[str] = None
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
 # Helper functions
-def prepare_for_mongo(data):
-    """Convert datetime objects to strings for MongoDB storage"""
-    if isinstance(data, dict):
-        for key, value in data.items():
-            if isinstance(value, datetime):
-                data[key] = value.isoformat()
-    return data
-
-def parse_from_mongo(item):
-    """Parse datetime strings back from MongoDB"""
-    if isinstance(item, dict):
-        for key, value in item.items():
-            if isinstance(value, str) and key.endswith('_at') or key.endswith('_date'):
-                try:
-                    item[key] = datetime.fromisoformat(value.replace('Z', '+00:00'))
-                except:
-                    pass
-    return item
+def mongo_day(field):
+    """Aggregation expression for the calendar day of a stored date, as midnight UTC"""
+    return {"$dateTrunc": {"date": field, "unit": "day"}}
+
+def mongo_days_between(start, end):
+    """Aggregation expression for the whole calendar days from one stored date to another"""
+    day_ms = 24 * 60 * 60 * 1000
+    return {"$toInt": {"$divide": [{"$subtract": [mongo_day(end), mongo_day(start)]}, day_ms]}}
+
+def encode_cursor(doc, sort_field="created_at"):
+    """Build an opaque keyset cursor from the (sort_field, id) of a document"""
+    payload = json.dumps([doc[sort_field].isoformat(), doc["id"]]).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+def decode_cursor(token, sort_field="created_at", descending=False):
+    """Turn a cursor token back into a filter for documents after it in the sort order"""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        last_value, last_id = json.loads(base64.urlsafe_b64decode(padded))
+        last_value = datetime.fromisoformat(last_value)
+        if not isinstance(last_id, str):
+            raise ValueError("malformed cursor")
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    after = "$lt" if descending else "$gt"
+    return {
+        "$or": [
+            {sort_field: {after: last_value}},
+            {sort_field: last_value, "id": {after: last_id}}
+        ]
+    }
+
+@lru_cache(maxsize=None)
+def response_projection(model):
+    """Mongo projection returning only the fields a response model exposes"""
+    return {"_id": 0, **{name: 1 for name in model.model_fields}}
+
+@lru_cache(maxsize=None)
+def response_defaults(model):
+    """Static defaults for optional model fields, filled into documents that predate them"""
+    return {
+        name: field.default for name, field in model.model_fields.items()
+        if not field.is_required() and field.default_factory is None
+    }
+
+def parse_name_list(value, allowed, parameter):
+    """Split a comma-separated query parameter, rejecting names that are not allowed"""
+    if not value:
+        return None
+    names = list(dict.fromkeys(name.strip() for name in value.split(",") if name.strip()))
+    unknown = [name for name in names if name not in allowed]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown {parameter}: {unknown}")
+    return names
+
+def field_projection(model, fields=None, required=()):
+    """Projection and defaults for an optional fields= selection, plus the required keys to drop afterwards"""
+    if not fields:
+        return response_projection(model), response_defaults(model), ()
+    hidden = tuple(name for name in dict.fromkeys(required) if name not in fields)
+    projection = {"_id": 0, **{name: 1 for name in (*fields, *hidden)}}
+    defaults = {name: value for name, value in response_defaults(model).items() if name in fields}
+    return projection, defaults, hidden
+
+# orjson writes UTC as +00:00 by default; Z matches the pydantic-encoded single-item responses
+ORJSON_OPTIONS = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+class UTCORJSONResponse(ORJSONResponse):
+    def render(self, content):
+        return orjson.dumps(content, option=ORJSON_OPTIONS)
+
+async def paginate(
+    collection, model, filter_query=None, limit=DEFAULT_PAGE_SIZE, cursor=None, stream=False,
+    sort_field="created_at", descending=False, fields=None, expand=None, expand_fields=()
+):
+    """Keyset-paginate a collection on (sort_field, id), or stream it as NDJSON"""
+    filter_query = dict(filter_query or {})
+    if cursor:
+        page_filter = decode_cursor(cursor, sort_field, descending)
+        filter_query = {"$and": [filter_query, page_filter]} if filter_query else page_filter
+    direction = -1 if descending else 1
+    sort = [(sort_field, direction), ("id", direction)]
+    # Documents were written through the same models, so they are projected in Mongo
+    # and encoded with orjson instead of being validated again on the way out
+    projection, defaults, hidden = field_projection(model, fields, ("id", sort_field, *expand_fields))
+
+    async def render(docs):
+        # `expand` attaches related documents to a whole page at once, reading `expand_fields`
+        if expand:
+            await expand(docs)
+        for doc in docs:
+            for name in hidden:
+                doc.pop(name, None)
+        return [{**defaults, **doc} for doc in docs]
+
+    if stream:
+        async def ndjson_lines():
+            batch = []
+            async for doc in collection.find(filter_query, projection).sort(sort):
+                batch.append(doc)
+                if len(batch) == DEFAULT_PAGE_SIZE:
+                    yield b"".join(orjson.dumps(doc, option=ORJSON_OPTIONS) + b"\n" for doc in await render(batch))
+                    batch = []
+            if batch:
+                yield b"".join(orjson.dumps(doc, option=ORJSON_OPTIONS) + b"\n" for doc in await render(batch))
+        return StreamingResponse(ndjson_lines(), media_type="application/x-ndjson")
+
+    # Fetch one extra document to know whether another page exists
+    docs = await collection.find(filter_query, projection).sort(sort).limit(limit + 1).to_list(limit + 1)
+    headers = {}
+    if len(docs) > limit:
+        docs = docs[:limit]
+        headers[NEXT_CURSOR_HEADER] = encode_cursor(docs[-1], sort_field)
+    return UTCORJSONResponse(await render(docs), headers=headers)
+
+class ServiceCatalog:
+    """In-process cache of parsed services, indexed by id and by name"""
+
+    def __init__(self, ttl_seconds):
+        self.ttl_seconds = ttl_seconds
+        self.by_id = {}
+        self.by_name = {}
+        self.loaded_at = None
+        self._lock = asyncio.Lock()
+
+    def invalidate(self):
+        self.loaded_at = None
+
+    def _add(self, service_obj):
+        self.by_id[service_obj.id] = service_obj
+        # Keep the oldest service for a name, matching find_one({"name": ...}) on the sorted load
+        self.by_name.setdefault(service_obj.name, service_obj)
+
+    async def refresh(self):
+        by_id, by_name = {}, {}
+        async for service in db.services.find().sort([("created_at", 1), ("id", 1)]):
+            service_obj = Service(**service)
+            by_id[service_obj.id] = service_obj
+            by_name.setdefault(service_obj.name, service_obj)
+        self.by_id, self.by_name = by_id, by_name
+        self.loaded_at = time.monotonic()
+
+    async def _ensure_fresh(self):
+        if self.loaded_at is not None and time.monotonic() - self.loaded_at < self.ttl_seconds:
+            return
+        async with self._lock:
+            if self.loaded_at is None or time.monotonic() - self.loaded_at >= self.ttl_seconds:
+                await self.refresh()
+
+    async def get(self, service_id):
+        await self._ensure_fresh()
+        service_obj = self.by_id.get(service_id)
+        if service_obj is None:
+            # Services created by another worker are picked up without waiting for the TTL
+            service = await db.services.find_one({"id": service_id})
+            if service:
+                service_obj = Service(**service)
+                self._add(service_obj)
+        return service_obj
+
+    async def get_many(self, service_ids):
+        await self._ensure_fresh()
+        found = {service_id: self.by_id[service_id] for service_id in service_ids if service_id in self.by_id}
+        missing = [service_id for service_id in service_ids if service_id not in found]
+        if missing:
+            async for service in db.services.find({"id": {"$in": missing}}):
+                service_obj = Service(**service)
+                self._add(service_obj)
+                found[service_obj.id] = service_obj
+        return found
+
+    async def get_many_by_name(self, names):
+        await self._ensure_fresh()
+        found = {name: self.by_name[name] for name in names if name in self.by_name}
+        missing = [name for name in names if name not in found]
+        if missing:
+            async for service in db.services.find({"name": {"$in": missing}}).sort([("created_at", 1), ("id", 1)]):
+                service_obj = Service(**service)
+                self._add(service_obj)
+                found.setdefault(service_obj.name, service_obj)
+        return found
+
+service_catalog = ServiceCatalog(SERVICE_CATALOG_TTL_SECONDS)
+
+class BookingEventBus:
+    """Fan-out of booking created/updated events to the connected SSE clients"""
+
+    # Events come from a MongoDB change stream when the server supports one (replica sets),
+    # otherwise the write paths publish them in-process
+    LOCAL = "local"
+    CHANGE_STREAM = "change_stream"
+
+    def __init__(self, queue_size):
+        self.queue_size = queue_size
+        self.subscribers = set()
+        self.source = self.LOCAL
+
+    def subscribe(self):
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self.subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue):
+        self.subscribers.discard(queue)
+
+    def publish(self, event_type, booking):
+        """Encode an event once and hand it to every subscriber"""
+        if not self.subscribers:
+            return
+        defaults = response_defaults(Booking)
+        payload = orjson.dumps(
+            {name: booking.get(name, defaults.get(name)) for name in Booking.model_fields}, option=ORJSON_OPTIONS
+        )
+        message = b"event: " + event_type.encode() + b"\ndata: " + payload + b"\n\n"
+        for queue in self.subscribers:
+            try:
+                queue.put_nowait(message)
+            except asyncio.QueueFull:
+                # A client that fell this far behind reloads the list instead of replaying every event
+                self._reset(queue)
+
+    def reset_all(self):
+        for queue in self.subscribers:
+            self._reset(queue)
+
+    def reset_message(self):
+        """Ask a client to reload the list; the source tells it whether it sees other workers' writes"""
+        return b"event: reset\ndata: " + orjson.dumps({"source": self.source}) + b"\n\n"
+
+    def _reset(self, queue):
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait(self.reset_message())
+
+    def publish_local(self, event_type, bookings):
+        """Publish from a write path, unless the change stream will deliver the event"""
+        if self.source == self.LOCAL:
+            for booking in bookings:
+                self.publish(event_type, booking)
+
+booking_events = BookingEventBus(BOOKING_EVENT_QUEUE_SIZE)
+booking_watch_task = None
+
+async def watch_booking_changes():
+    """Feed booking_events from a change stream on the bookings collection, reopening it after errors"""
+    while True:
+        try:
+            async with db.bookings.watch(
+                [{"$match": {"operationType": {"$in": ["insert", "update", "replace"]}}}],
+                full_document="updateLookup"
+            ) as stream:
+                # The first getMore opens the stream, and fails on a standalone server
+                change = await stream.try_next()
+                if booking_events.source != BookingEventBus.CHANGE_STREAM:
+                    logger.info("Booking events are fed by a MongoDB change stream")
+                    booking_events.source = BookingEventBus.CHANGE_STREAM
+                while True:
+                    if change and change.get("fullDocument"):
+                        event_type = "created" if change["operationType"] == "insert" else "updated"
+                        booking_events.publish(event_type, change["fullDocument"])
+                    change = await stream.try_next()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            if booking_events.source == BookingEventBus.LOCAL:
+                logger.info(f"Change streams unavailable ({e}), publishing booking events in-process")
+                return
+            # The driver already retried a resumable error once; events may have been missed
+            # while the stream was down, so clients reload instead of trusting their deltas
+            logger.warning(f"Booking change stream interrupted, reopening: {e}")
+            booking_events.reset_all()
+            await asyncio.sleep(1)
+
+def holiday_datetime(day):
+    """BSON has no date type, so holidays are stored as midnight UTC"""
+    return datetime.combine(day, datetime.min.time(), tzinfo=timezone.utc)
+
+class DeliveryCalendar:
+    """Working-day calendar for delivery estimates, cached in process like the service catalog"""
+
+    def __init__(self, working_days, ttl_seconds):
+        self.working_days = working_days
+        self.ttl_seconds = ttl_seconds
+        self.busdaycal = np.busdaycalendar(weekmask=working_days)
+        self.loaded_at = None
+        self._lock = asyncio.Lock()
+
+    def invalidate(self):
+        self.loaded_at = None
+
+    def _is_fresh(self):
+        return self.loaded_at is not None and time.monotonic() - self.loaded_at < self.ttl_seconds
+
+    async def _ensure_fresh(self):
+        if self._is_fresh():
+            return
+        async with self._lock:
+            if self._is_fresh():
+                return
+            holidays = [doc["date"].date() async for doc in db.delivery_holidays.find({}, {"date": 1})]
+            self.busdaycal = np.busdaycalendar(weekmask=self.working_days, holidays=holidays)
+            self.loaded_at = time.monotonic()
+
+    def add_working_days(self, start, days):
+        """Dates `days` working days after `start`, rolling a non-working start forward; both may be arrays"""
+        start = np.asarray(start, dtype="datetime64[D]")
+        return np.busday_offset(start, np.asarray(days), roll="forward", busdaycal=self.busdaycal)
+
+    async def estimate_many(self, day_counts, booked_on=None):
+        """Estimated delivery for each number of working days, computed in one vectorized offset"""
+        await self._ensure_fresh()
+        day_counts = sorted(set(day_counts))
+        if not day_counts:
+            return {}
+        booked_on = booked_on or datetime.now(timezone.utc).date()
+        dates = self.add_working_days(booked_on, day_counts)
+        return {days: holiday_datetime(day.astype(date)) for days, day in zip(day_counts, dates)}
+
+    async def estimate(self, days, booked_on=None):
+        return (await self.estimate_many([days], booked_on))[days]
+
+delivery_calendar = DeliveryCalendar(DELIVERY_WORKING_DAYS, DELIVERY_CALENDAR_TTL_SECONDS)
+
+class PricingEngine:
+    """Prices (service, quantity, customer) lines from the pricing rules of catalog services"""
+
+    def __init__(self):
+        self._compiled = {}
+
+    def _rules(self, service_obj):
+        """Tier arrays and discount table for a service, rebuilt when the catalog reloads it"""
+        cached = self._compiled.get(service_obj.id)
+        if cached is None or cached[0] is not service_obj:
+            pricing = service_obj.pricing or PricingRules()
+            tiers = sorted(pricing.tiers, key=lambda tier: tier.min_quantity)
+            # The base price applies from one unit; a tier starting at one overrides it
+            min_quantities = np.array([1] + [tier.min_quantity for tier in tiers], dtype=np.int64)
+            unit_prices = np.array([service_obj.base_price] + [tier.unit_price for tier in tiers], dtype=np.float64)
+            discounts = {discount.customer_id: discount.percent for discount in pricing.customer_discounts}
+            cached = self._compiled[service_obj.id] = (service_obj, min_quantities, unit_prices, discounts)
+        return cached[1:]
+
+    def price(self, services, service_ids, quantities, customer_ids):
+        """Unit prices, discount percents and rounded totals for parallel sequences of lines"""
+        service_ids = np.asarray(service_ids, dtype=object)
+        quantities = np.asarray(quantities, dtype=np.int64)
+        customer_ids = pd.Series(customer_ids, dtype=object)
+        unit_prices = np.full(len(quantities), np.nan)
+        discounts = np.zeros(len(quantities))
+        
+        # One searchsorted over the tier boundaries prices every line of a service at once
+        codes, unique_ids = pd.factorize(service_ids)
+        for code, service_id in enumerate(unique_ids):
+            service_obj = services.get(service_id)
+            if service_obj is None:
+                continue
+            lines = codes == code
+            min_quantities, tier_prices, customer_discounts = self._rules(service_obj)
+            tier = np.searchsorted(min_quantities, quantities[lines], side="right") - 1
+            unit_prices[lines] = tier_prices[np.maximum(tier, 0)]
+            if customer_discounts:
+                discounts[lines] = customer_ids[lines].map(customer_discounts).fillna(0).to_numpy(dtype=np.float64)
+        
+        totals = np.round(unit_prices * quantities * (1 - discounts / 100), 2)
+        return unit_prices, discounts, totals
+
+    def price_bookings(self, bookings):
+        """Total price for each (BookingCreate, Service) pair"""
+        if not bookings:
+            return []
+        services = {service_obj.id: service_obj for _, service_obj in bookings}
+        _, _, totals = self.price(
+            services,
+            [service_obj.id for _, service_obj in bookings],
+            [booking_data.quantity for booking_data, _ in bookings],
+            [booking_data.customer_id for booking_data, _ in bookings]
+        )
+        return totals.tolist()
+
+pricing_engine = PricingEngine()
+
+def build_booking(booking_data, total_price, estimated_delivery):
+    """Attach the quoted price and estimated delivery date to a booking request"""
+    return Booking(
+        **booking_data.dict(),
+        total_price=total_price,
+        estimated_delivery_date=estimated_delivery
+    )
+
+def delivery_performance_fields(created_at, estimated_delivery_date, actual_delivery_date):
+    """Variance and on-time flag stored on a booking when it is marked delivered"""
+    estimated_days = (estimated_delivery_date.date() - created_at.date()).days
+    actual_days = (actual_delivery_date.date() - created_at.date()).days
+    return {
+        "delivery_variance_days": actual_days - estimated_days,
+        "delivered_on_time": actual_days <= estimated_days
+    }
+
+def version_etag(version):
+    return f'"{version}"'
+
+def parse_version_etag(value):
+    """Read the booking version out of an If-Match header, or None for `*` (any current version)"""
+    value = value.strip()
+    if value == "*":
+        return None
+    if value.startswith("W/"):
+        value = value[2:]
+    try:
+        return int(value.strip('"'))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="If-Match must be a booking version ETag")
+
+def booking_rollup_counts(booking):
+    """Counters a single booking document contributes to the overview rollup"""
+    status = BookingStatus(booking["status"]).value
+    counts = {"total_bookings": 1, f"status_counts.{status}": 1}
+    if status == BookingStatus.DELIVERED.value and booking.get("delivered_on_time") is not None:
+        counts["total_delivered"] = 1
+        counts["on_time_deliveries"] = 1 if booking["delivered_on_time"] else 0
+    return counts
+
+def booking_rollup_delta(before, after):
+    """Counter changes needed when a booking document goes from before to after"""
+    delta = dict(booking_rollup_counts(after))
+    for key, value in booking_rollup_counts(before).items():
+        delta[key] = delta.get(key, 0) - value
+    return delta
+
+async def increment_rollup(counts, changed=()):
+    """Atomically apply counter changes to the overview rollup and bump the change counters of `changed` collections"""
+    counts = {key: value for key, value in counts.items() if value}
+    # The per-collection change counters behind the read ETags live on the same document,
+    # so recording a write costs no extra round trip
+    counts.update({f"versions.{collection_name}": 1 for collection_name in changed})
+    if counts:
+        await db.analytics_rollups.update_one(
+            {"_id": OVERVIEW_ROLLUP_ID},
+            {"$inc": counts, "$setOnInsert": {"epoch": uuid.uuid4().hex[:12]}},
+            upsert=True
+        )
+
+def rollup_etag(rollup, *collection_names):
+    """Strong ETag for a response built from `collection_names`, from their change counters"""
+    # The epoch changes whenever the rollup document is recreated, so counters that restart
+    # from zero can never match an ETag handed out before
+    versions = (rollup or {}).get("versions", {})
+    counters = ".".join(str(versions.get(collection_name, 0)) for collection_name in collection_names)
+    return f'"{(rollup or {}).get("epoch", "0")}.{counters}"'
+
+async def collection_etag(*collection_names):
+    """Read the change counters of the collections a response is built from"""
+    # Endpoints call this before running their query, so a concurrent write can only
+    # make the ETag older than the body, never newer
+    rollup = await db.analytics_rollups.find_one({"_id": OVERVIEW_ROLLUP_ID}, {"epoch": 1, "versions": 1})
+    return rollup_etag(rollup, *collection_names)
+
+def etag_matches(if_none_match, etag):
+    """Weak comparison of an If-None-Match header against an ETag, as conditional GETs use"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+def not_modified(etag):
+    return Response(status_code=304, headers={"ETag": etag})
+
+def customer_document(customer_obj):
+    """Customer as stored, with the lowercased name and email the prefix search indexes are built on"""
+    customer_dict = customer_obj.dict()
+    customer_dict["name_lower"] = customer_obj.name.lower()
+    customer_dict["email_lower"] = customer_obj.email.lower()
+    return customer_dict
+
+async def migrate_string_dates(batch_size=1000):
+    """Convert ISO-string dates left by older releases, so cursors and date pipelines only see datetimes"""
+    # Same resumable batches as migrate_dates.py; an already migrated database costs one
+    # find_one per collection
+    for collection_name, fields in DATE_FIELDS.items():
+        collection = db[collection_name]
+        if not await collection.find_one(string_date_filter(fields), {"_id": 1}):
+            continue
+        projection = {field: 1 for field in fields}
+        migrated = 0
+        last_id = None
+        while True:
+            batch = await collection.find(string_date_filter(fields, last_id), projection).sort("_id", 1).limit(batch_size).to_list(None)
+            if not batch:
+                break
+            last_id = batch[-1]["_id"]
+            operations, _ = date_updates(collection_name, batch, fields)
+            if operations:
+                await collection.bulk_write(operations, ordered=False)
+            migrated += len(operations)
+        logger.info(f"Converted string dates on {migrated} {collection_name}")
+
+async def backfill_customer_search_fields(batch_size=1000):
+    """Add the search fields to customers written before they existed"""
+    # Lowercase in Python like customer_document does; MongoDB's $toLower only folds ASCII
+    missing = {"name_lower": {"$exists": False}}
+    updated = 0
+    last_id = None
+    while True:
+        query = missing if last_id is None else {**missing, "_id": {"$gt": last_id}}
+        batch = await db.customers.find(query, {"name": 1, "email": 1}).sort("_id", 1).limit(batch_size).to_list(None)
+        if not batch:
+            break
+        last_id = batch[-1]["_id"]
+        await db.customers.bulk_write([
+            UpdateOne({"_id": doc["_id"]}, {"$set": {
+                "name_lower": str(doc.get("name", "")).lower(),
+                "email_lower": str(doc.get("email", "")).lower()
+            }})
+            for doc in batch
+        ], ordered=False)
+        updated += len(batch)
+    if updated:
+        logger.info(f"Added search fields to {updated} customers")
+
+async def rebuild_analytics_rollup():
+    """Recompute the overview rollup from the collections and replace the stored counters"""
+    # Get booking counts by status
+    status_counts = await db.bookings.aggregate([
+        {"$group": {"_id": "$status", "count": {"$sum": 1}}}
+    ]).to_list(None)
+    
+    # Get on-time delivery totals
+    delivery_stats = await db.bookings.aggregate([
+        {
+            "$match": {
+                "status": "delivered",
+                "delivered_on_time": {"$exists": True}
+            }
+        },
+        {
+            "$group": {
+                "_id": None,
+                "total_delivered": {"$sum": 1},
+                "on_time_deliveries": {
+                    "$sum": {"$cond": [{"$eq": ["$delivered_on_time", True]}, 1, 0]}
+                }
+            }
+        }
+    ]).to_list(1)
+    
+    rollup = {
+        "status_counts": {item["_id"]: item["count"] for item in status_counts},
+        "total_delivered": delivery_stats[0]["total_delivered"] if delivery_stats else 0,
+        "on_time_deliveries": delivery_stats[0]["on_time_deliveries"] if delivery_stats else 0,
+        "total_customers": await db.customers.count_documents({}),
+        "total_services": await db.services.count_documents({}),
+        "total_bookings": await db.bookings.count_documents({})
+    }
+    # Keep the change counters and bump them all, since every cached overview may now be stale
+    result = await db.analytics_rollups.find_one_and_update(
+        {"_id": OVERVIEW_ROLLUP_ID},
+        {
+            "$set": rollup,
+            "$inc": {f"versions.{collection_name}": 1 for collection_name in ("customers", "services", "bookings")},
+            "$setOnInsert": {"epoch": uuid.uuid4().hex[:12]}
+        },
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    return result
+
+async def ensure_indexes():
+    """Create the indexes the endpoints rely on, logging any that cannot be built"""
+    for collection_name, indexes in INDEXES.items():
+        for index in indexes:
+            try:
+                await db[collection_name].create_indexes([index])
+            except OperationFailure as e:
+                logger.warning(f"Could not create index {index.document['name']} on {collection_name}: {e}")
+
+def plan_stages(plan):
+    """Collect every stage name in an explain() plan tree"""
+    stages = []
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            stages.append(plan["stage"])
+        for value in plan.values():
+            stages.extend(plan_stages(value))
+    elif isinstance(plan, list):
+        for value in plan:
+            stages.extend(plan_stages(value))
+    return stages
+
+def plan_index_names(plan):
+    """Collect every index name used in an explain() plan tree"""
+    names = []
+    if isinstance(plan, dict):
+        if "indexName" in plan:
+            names.append(plan["indexName"])
+        for value in plan.values():
+            names.extend(plan_index_names(value))
+    elif isinstance(plan, list):
+        for value in plan:
+            names.extend(plan_index_names(value))
+    return names
+
+def external_ref_value(value):
+    """Idempotency key from an upload cell, or None when the row has none"""
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return None
+    if isinstance(value, float) and value.is_integer():
+        # Numeric references come back from pandas as floats when the column has gaps
+        value = int(value)
+    return str(value).strip() or None
+
+async def import_booking_chunk(chunk):
+    """Import one chunk of upload rows with a fixed number of database round trips"""
+    records = list(zip(chunk.index, chunk.to_dict("records")))
+    errors = {}
+
+    # Skip rows whose external_ref was already imported; repeats within the chunk are skipped
+    # once a valid row with that ref is about to be written
+    external_refs = {}
+    for index, row in records:
+        external_ref = external_ref_value(row.get("external_ref"))
+        if external_ref:
+            external_refs[index] = external_ref
+    skipped = set()
+    if external_refs:
+        stored_refs = set()
+        async for booking in db.bookings.find(
+            {"external_ref": {"$in": list(set(external_refs.values()))}}, {"external_ref": 1}
+        ):
+            stored_refs.add(booking["external_ref"])
+        skipped = {index for index, external_ref in external_refs.items() if external_ref in stored_refs}
+        records = [(index, row) for index, row in records if index not in skipped]
+
+    # Resolve every customer email in the chunk with one $in query
+    emails = {row["customer_email"] for _, row in records if isinstance(row["customer_email"], str)}
+    customer_ids = {}
+    if emails:
+        async for customer in db.customers.find({"email": {"$in": list(emails)}}, {"email": 1, "id": 1}):
+            customer_ids[customer["email"]] = customer["id"]
+
+    # Upsert customers that do not exist yet with one bulk_write
+    new_customers = {}
+    for index, row in records:
+        if row["customer_email"] in customer_ids or row["customer_email"] in new_customers:
+            continue
+        try:
+            customer_data = CustomerCreate(
+                name=row['customer_name'],
+                email=row['customer_email']
+            )
+            new_customers[customer_data.email] = Customer(**customer_data.dict())
+        except Exception as e:
+            errors[index] = f"Row {index + 1}: {str(e)}"
+
+    if new_customers:
+        operations = [
+            UpdateOne({"email": email}, {"$setOnInsert": customer_document(customer_obj)}, upsert=True)
+            for email, customer_obj in new_customers.items()
+        ]
+        result = await db.customers.bulk_write(operations, ordered=False)
+        await increment_rollup(
+            {"total_customers": result.upserted_count}, changed=("customers",) if result.upserted_count else ()
+        )
+        if result.upserted_count == len(new_customers):
+            customer_ids.update({email: customer_obj.id for email, customer_obj in new_customers.items()})
+        else:
+            # Another writer created some of these customers first, so read back the ids that won
+            async for customer in db.customers.find({"email": {"$in": list(new_customers)}}, {"email": 1, "id": 1}):
+                customer_ids[customer["email"]] = customer["id"]
+
+    # Resolve every service name in the chunk from the service catalog
+    service_names = {row["service_name"] for _, row in records if isinstance(row["service_name"], str)}
+    services = await service_catalog.get_many_by_name(service_names)
+
+    # Every row is booked today, so one vectorized calendar offset covers the whole chunk
+    estimated_deliveries = await delivery_calendar.estimate_many(
+        service_obj.estimated_delivery_days for service_obj in services.values()
+    )
+    
+    # Validate every row, then price the whole chunk in one pass over the cached pricing rules
+    pending = []
+    for index, row in records:
+        if index in errors:
+            continue
+        try:
+            service_obj = services.get(row['service_name'])
+            if not service_obj:
+                errors[index] = f"Row {index + 1}: Service '{row['service_name']}' not found"
+                continue
+            
+            booking_data = BookingCreate(
+                customer_id=customer_ids[row['customer_email']],
+                service_id=service_obj.id,
+                quantity=int(row.get('quantity', 1)),
+                notes=row.get('notes', ''),
+                external_ref=external_refs.get(index)
+            )
+            pending.append((index, booking_data, service_obj))
+        except Exception as e:
+            errors[index] = f"Row {index + 1}: {str(e)}"
+    totals = pricing_engine.price_bookings([(booking_data, service_obj) for _, booking_data, service_obj in pending])
+    
+    # Build every booking for the chunk in memory
+    booking_rows = []
+    booking_docs = []
+    written_refs = set()
+    for (index, booking_data, service_obj), total_price in zip(pending, totals):
+        try:
+            booking_obj = build_booking(
+                booking_data, total_price, estimated_deliveries[service_obj.estimated_delivery_days]
+            )
+            # Only a row that will actually be written claims its ref for the rest of the chunk
+            if booking_obj.external_ref:
+                if booking_obj.external_ref in written_refs:
+                    skipped.add(index)
+                    continue
+                written_refs.add(booking_obj.external_ref)
+            booking_rows.append(index)
+            booking_docs.append(booking_obj.dict())
+        except Exception as e:
+            errors[index] = f"Row {index + 1}: {str(e)}"
+
+    # Write all bookings with one unordered insert_many
+    successful_imports = len(booking_docs)
+    if booking_docs:
+        failed_positions = set()
+        try:
+            await db.bookings.insert_many(booking_docs, ordered=False)
+        except BulkWriteError as e:
+            for write_error in e.details.get("writeErrors", []):
+                failed_positions.add(write_error["index"])
+                index = booking_rows[write_error["index"]]
+                successful_imports -= 1
+                if write_error.get("code") == 11000 and "external_ref" in write_error.get("keyPattern", {}):
+                    # A concurrent import stored the same external_ref first
+                    skipped.add(index)
+                else:
+                    errors[index] = f"Row {index + 1}: {write_error['errmsg']}"
+        await increment_rollup({
+            "total_bookings": successful_imports,
+            f"status_counts.{BookingStatus.PENDING.value}": successful_imports
+        }, changed=("bookings",) if successful_imports else ())
+        booking_events.publish_local("created", (
+            doc for position, doc in enumerate(booking_docs) if position not in failed_positions
+        ))
+
+    return successful_imports, len(errors), len(skipped), [errors[index] for index in sorted(errors)]
+
+async def export_batches(filter_query):
+    """Yield bookings matching a filter as lists of export rows, straight from the cursor"""
+    projection = {"_id": 0, **{column: 1 for column in EXPORT_COLUMNS}}
+    cursor = db.bookings.find(filter_query, projection).sort([("created_at", 1), ("id", 1)]).batch_size(EXPORT_BATCH_SIZE)
+    batch = []
+    async for doc in cursor:
+        batch.append([doc.get(column) for column in EXPORT_COLUMNS])
+        if len(batch) == EXPORT_BATCH_SIZE:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+async def export_csv_chunks(batches):
+    """Encode each batch of export rows as one chunk of a streamed CSV file"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    async for batch in batches:
+        writer.writerows(
+            [value.isoformat() if isinstance(value, datetime) else value for value in row]
+            for row in batch
+        )
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+def excel_value(value):
+    # Excel has no time zones, so datetimes are written as naive UTC
+    if isinstance(value, datetime) and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+async def spool_xlsx(batches):
+    """Write export batches to a write-only workbook in a spooled temporary file"""
+    loop = asyncio.get_running_loop()
+    spooled = tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_MAX_BYTES)
+    workbook = Workbook(write_only=True)
+    sheet = None
+    sheet_rows = 0
+
+    def append_rows(batch):
+        nonlocal sheet, sheet_rows
+        for row in batch:
+            if sheet is None or sheet_rows == XLSX_MAX_DATA_ROWS:
+                # Each sheet repeats the header row
+                sheet = workbook.create_sheet("Bookings" if sheet is None else f"Bookings {len(workbook.worksheets) + 1}")
+                sheet.append(EXPORT_COLUMNS)
+                sheet_rows = 0
+            sheet.append([excel_value(value) for value in row])
+            sheet_rows += 1
+
+    try:
+        async for batch in batches:
+            await loop.run_in_executor(None, append_rows, batch)
+        if sheet is None:
+            # An empty export still has its header row
+            sheet = workbook.create_sheet("Bookings")
+            sheet.append(EXPORT_COLUMNS)
+        await loop.run_in_executor(None, workbook.save, spooled)
+    except BaseException:
+        spooled.close()
+        raise
+    spooled.seek(0)
+    return spooled
+
+def export_arrow_schema():
+    """Arrow schema for the Parquet export, in EXPORT_COLUMNS order"""
+    arrow_types = {
+        "string": pa.string(),
+        "int64": pa.int64(),
+        "float64": pa.float64(),
+        "bool": pa.bool_(),
+        "timestamp": pa.timestamp("ms", tz="UTC"),
+    }
+    return pa.schema([(column, arrow_types[type_name]) for column, type_name in EXPORT_COLUMN_TYPES.items()])
+
+async def spool_parquet(batches):
+    """Write export batches as Parquet row groups in a spooled temporary file"""
+    loop = asyncio.get_running_loop()
+    spooled = tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_MAX_BYTES)
+    schema = export_arrow_schema()
+    writer = pq.ParquetWriter(spooled, schema)
+
+    def write_batch(batch):
+        columns = list(zip(*batch))
+        writer.write_table(pa.Table.from_arrays(
+            [pa.array(values, type=field.type) for values, field in zip(columns, schema)], schema=schema
+        ))
+
+    try:
+        try:
+            async for batch in batches:
+                await loop.run_in_executor(None, write_batch, batch)
+        finally:
+            writer.close()
+    except BaseException:
+        spooled.close()
+        raise
+    spooled.seek(0)
+    return spooled
+
+def spooled_file_chunks(spooled, chunk_size=64 * 1024):
+    """Stream a spooled export file to the client and close it afterwards"""
+    try:
+        while chunk := spooled.read(chunk_size):
+            yield chunk
+    finally:
+        spooled.close()
+
+def read_upload_columns(filename, content):
+    """Read only the header row of an uploaded CSV or Excel file"""
+    if filename.endswith('.csv'):
+        return list(pd.read_csv(io.BytesIO(content), encoding='utf-8', nrows=0).columns)
+    if filename.endswith('.xlsx'):
+        workbook = load_workbook(io.BytesIO(content), read_only=True, data_only=True)
+        try:
+            header = next(workbook.active.iter_rows(max_row=1, values_only=True), ())
+        finally:
+            workbook.close()
+        return [column for column in header if column is not None]
+    return list(pd.read_excel(io.BytesIO(content), nrows=0).columns)
+
+def read_upload_chunks(filename, content):
+    """Yield an uploaded CSV or Excel file as DataFrames of IMPORT_CHUNK_SIZE rows, indexed by row position"""
+    if filename.endswith('.csv'):
+        with pd.read_csv(io.BytesIO(content), encoding='utf-8', chunksize=IMPORT_CHUNK_SIZE) as reader:
+            yield from reader
+    elif filename.endswith('.xlsx'):
+        # openpyxl's read-only mode streams rows instead of loading the whole sheet
+        workbook = load_workbook(io.BytesIO(content), read_only=True, data_only=True)
+        try:
+            rows = workbook.active.iter_rows(values_only=True)
+            header = list(next(rows, ()))
+            batch = []
+            row_number = 0
+            for values in rows:
+                if all(value is None for value in values):
+                    continue
+                batch.append(values)
+                if len(batch) == IMPORT_CHUNK_SIZE:
+                    yield pd.DataFrame(batch, columns=header, index=range(row_number, row_number + len(batch)))
+                    row_number += len(batch)
+                    batch = []
+            if batch:
+                yield pd.DataFrame(batch, columns=header, index=range(row_number, row_number + len(batch)))
+        finally:
+            workbook.close()
+    else:
+        # Legacy .xls has no streaming reader, so parse it whole and slice
+        df = pd.read_excel(io.BytesIO(content))
+        for chunk_start in range(0, len(df), IMPORT_CHUNK_SIZE):
+            yield df.iloc[chunk_start:chunk_start + IMPORT_CHUNK_SIZE]
+
+async def parse_upload_columns(filename, content):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(upload_parse_executor, read_upload_columns, filename, content)
+
+async def parse_upload_chunks(filename, content):
+    """Parse an upload on the parser threads, reading the next chunk while the current one is imported"""
+    loop = asyncio.get_running_loop()
+    reader = read_upload_chunks(filename, content)
+    next_chunk = loop.run_in_executor(upload_parse_executor, next, reader, None)
+    while True:
+        chunk = await next_chunk
+        if chunk is None:
+            break
+        next_chunk = loop.run_in_executor(upload_parse_executor, next, reader, None)
+        yield chunk
+
+async def import_bookings(filename, chunks, on_progress=None):
+    """Import parsed upload chunks as they arrive, reporting progress after each chunk"""
+    result = FileUploadResult(filename=filename, records_processed=0, successful_imports=0, failed_imports=0)
+    
+    async for chunk in chunks:
+        chunk_successful, chunk_failed, chunk_skipped, chunk_errors = await import_booking_chunk(chunk)
+        result.records_processed += len(chunk)
+        result.successful_imports += chunk_successful
+        result.failed_imports += chunk_failed
+        result.skipped_duplicates += chunk_skipped
+        result.errors.extend(chunk_errors)
+        if on_progress:
+            await on_progress(len(chunk), chunk_successful, chunk_failed, chunk_skipped, chunk_errors)
+    
+    return result
+
+def upload_fingerprint(content):
+    return hashlib.sha256(content).hexdigest()
+
+async def claim_import_fingerprint(fingerprint, filename, claim_id, job_id=None):
+    """Record that an upload is being imported, returning the earlier record if the same file was seen before"""
+    now = datetime.now(timezone.utc)
+    claim = {"filename": filename, "claim_id": claim_id, "job_id": job_id, "claimed_at": now}
+    try:
+        await db.import_fingerprints.insert_one({"fingerprint": fingerprint, "result": None, "created_at": now, **claim})
+        return None
+    except DuplicateKeyError:
+        pass
+    # Take over an unfinished claim whose lease ran out
+    reclaimed = await db.import_fingerprints.find_one_and_update(
+        {
+            "fingerprint": fingerprint,
+            "result": None,
+            "claimed_at": {"$lt": now - timedelta(seconds=IMPORT_CLAIM_LEASE_SECONDS)}
+        },
+        {"$set": claim}
+    )
+    if reclaimed:
+        return None
+    return await db.import_fingerprints.find_one({"fingerprint": fingerprint}, {"_id": 0}) or {}
+
+async def renew_import_fingerprint(fingerprint, claim_id):
+    await db.import_fingerprints.update_one(
+        {"fingerprint": fingerprint, "claim_id": claim_id},
+        {"$set": {"claimed_at": datetime.now(timezone.utc)}}
+    )
+
+async def complete_import_fingerprint(fingerprint, claim_id, result):
+    # Only touch the claim this import holds, in case its lease ran out and another upload took it over
+    claim_filter = {"fingerprint": fingerprint, "claim_id": claim_id}
+    if result is None:
+        # The import failed, so release the fingerprint and let the file be uploaded again
+        await db.import_fingerprints.delete_one(claim_filter)
+    else:
+        stored = result.dict()
+        stored["errors"] = stored["errors"][:MAX_STORED_IMPORT_ERRORS]
+        await db.import_fingerprints.update_one(
+            claim_filter, {"$set": {"result": stored, "error_count": len(result.errors)}}
+        )
+
+def stored_import_result(record):
+    """Rebuild the FileUploadResult kept with a fingerprint, noting any errors that were not stored"""
+    result = FileUploadResult(**record["result"])
+    omitted = record.get("error_count", len(result.errors)) - len(result.errors)
+    if omitted > 0:
+        result.errors.append(f"... and {omitted} more errors")
+    return result
+
+async def fail_interrupted_import_jobs():
+    """Mark jobs left queued or running by a previous process as failed and release their fingerprints"""
+    # Import jobs run as tasks inside the process that accepted them, so none survive a restart
+    active = {"status": {"$in": [ImportJobStatus.QUEUED.value, ImportJobStatus.RUNNING.value]}}
+    job_ids = [job["id"] async for job in db.import_jobs.find(active, {"id": 1})]
+    if not job_ids:
+        return
+    await db.import_jobs.update_many({"id": {"$in": job_ids}, **active}, {"$set": {
+        "status": ImportJobStatus.FAILED.value,
+        "error": "Interrupted by a server restart",
+        "finished_at": datetime.now(timezone.utc)
+    }})
+    await db.import_fingerprints.delete_many({"job_id": {"$in": job_ids}, "result": None})
+    logger.warning(f"Marked {len(job_ids)} interrupted import jobs as failed")
+
+async def run_import_job(job_id, filename, content, fingerprint):
+    """Run a queued import job once a worker slot is free, recording progress on the job document"""
+    async with import_job_slots:
+        await renew_import_fingerprint(fingerprint, job_id)
+        started = time.monotonic()
+        await db.import_jobs.update_one({"id": job_id}, {"$set": {
+            "status": ImportJobStatus.RUNNING.value,
+            "started_at": datetime.now(timezone.utc)
+        }})
+        processed = 0
+
+        async def on_progress(rows, successful, failed, skipped, errors):
+            nonlocal processed
+            processed += rows
+            await renew_import_fingerprint(fingerprint, job_id)
+            elapsed = time.monotonic() - started
+            await db.import_jobs.update_one({"id": job_id}, {
+                "$inc": {
+                    "records_processed": rows,
+                    "successful_imports": successful,
+                    "failed_imports": failed,
+                    "skipped_duplicates": skipped
+                },
+                "$set": {"rows_per_second": round(processed / elapsed, 2) if elapsed else 0},
+                # failed_imports keeps the true count; the job document only keeps the first errors
+                "$push": {"errors": {"$each": errors, "$slice": MAX_STORED_IMPORT_ERRORS}}
+            })
+
+        result = None
+        try:
+            result = await import_bookings(filename, parse_upload_chunks(filename, content), on_progress)
+            update = {"status": ImportJobStatus.COMPLETED.value, "total_records": result.records_processed}
+        except Exception as e:
+            logger.exception(f"Import job {job_id} failed")
+            update = {"status": ImportJobStatus.FAILED.value, "error": str(e)}
+        update["finished_at"] = datetime.now(timezone.utc)
+        await db.import_jobs.update_one({"id": job_id}, {"$set": update})
+        await complete_import_fingerprint(fingerprint, job_id, result)
 
 # API Endpoints
 
@@ -138,41 +1601,154 @@ def parse_from_mongo(item):
 @api_router.post("/customers", response_model=Customer)
 async def create_customer(customer: CustomerCreate):
     customer_obj = Customer(**customer.dict())
-    customer_dict = prepare_for_mongo(customer_obj.dict())
-    await db.customers.insert_one(customer_dict)
+    customer_dict = customer_document(customer_obj)
+    try:
+        await db.customers.insert_one(customer_dict)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Customer with this email already exists")
+    await increment_rollup({"total_customers": 1}, changed=("customers",))
     return customer_obj
 
 @api_router.get("/customers", response_model=List[Customer])
-async def get_customers():
-    customers = await db.customers.find().to_list(1000)
-    return [Customer(**parse_from_mongo(customer)) for customer in customers]
+async def get_customers(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    stream: bool = False,
+    fields: Optional[str] = None,
+    if_none_match: Optional[str] = Header(None)
+):
+    fields = parse_name_list(fields, Customer.model_fields, "fields")
+    etag = await collection_etag("customers")
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    response = await paginate(db.customers, Customer, limit=limit, cursor=cursor, stream=stream, fields=fields)
+    response.headers["ETag"] = etag
+    return response
+
+@api_router.get("/customers/search", response_model=List[Customer])
+async def search_customers(
+    q: str = Query(..., min_length=1),
+    limit: int = Query(DEFAULT_SEARCH_LIMIT, ge=1, le=MAX_SEARCH_LIMIT),
+    if_none_match: Optional[str] = Header(None)
+):
+    query = q.strip().lower()
+    if not query:
+        raise HTTPException(status_code=400, detail="Search query must not be blank")
+    etag = await collection_etag("customers")
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    
+    # Anchored prefixes on the lowercased fields are bounded index range scans, so each
+    # branch reads at most `limit` index entries whatever the size of the collection
+    prefix = {"$regex": "^" + re.escape(query)}
+    projection = response_projection(Customer)
+    defaults = response_defaults(Customer)
+    by_name, by_email = await asyncio.gather(*(
+        db.customers.find({field: prefix}, projection).sort([(field, 1), ("id", 1)]).to_list(limit)
+        for field in ("name_lower", "email_lower")
+    ))
+    
+    # Name matches first, then email matches that are not already listed
+    matches = {}
+    for doc in by_name + by_email:
+        matches.setdefault(doc["id"], doc)
+    return UTCORJSONResponse([{**defaults, **doc} for doc in list(matches.values())[:limit]], headers={"ETag": etag})
 
 @api_router.get("/customers/{customer_id}", response_model=Customer)
-async def get_customer(customer_id: str):
+async def get_customer(customer_id: str, response: Response, if_none_match: Optional[str] = Header(None)):
+    etag = await collection_etag("customers")
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
     customer = await db.customers.find_one({"id": customer_id})
     if not customer:
         raise HTTPException(status_code=404, detail="Customer not found")
-    return Customer(**parse_from_mongo(customer))
+    response.headers["ETag"] = etag
+    return Customer(**customer)
 
 # Service Management
 @api_router.post("/services", response_model=Service)
 async def create_service(service: ServiceCreate):
     service_obj = Service(**service.dict())
-    service_dict = prepare_for_mongo(service_obj.dict())
+    service_dict = service_obj.dict()
     await db.services.insert_one(service_dict)
+    service_catalog.invalidate()
+    await increment_rollup({"total_services": 1}, changed=("services",))
     return service_obj
 
 @api_router.get("/services", response_model=List[Service])
-async def get_services():
-    services = await db.services.find().to_list(1000)
-    return [Service(**parse_from_mongo(service)) for service in services]
+async def get_services(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    stream: bool = False,
+    fields: Optional[str] = None,
+    if_none_match: Optional[str] = Header(None)
+):
+    fields = parse_name_list(fields, Service.model_fields, "fields")
+    etag = await collection_etag("services")
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    response = await paginate(db.services, Service, limit=limit, cursor=cursor, stream=stream, fields=fields)
+    response.headers["ETag"] = etag
+    return response
 
 @api_router.get("/services/{service_id}", response_model=Service)
-async def get_service(service_id: str):
+async def get_service(service_id: str, response: Response, if_none_match: Optional[str] = Header(None)):
+    etag = await collection_etag("services")
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
     service = await db.services.find_one({"id": service_id})
     if not service:
         raise HTTPException(status_code=404, detail="Service not found")
-    return Service(**parse_from_mongo(service))
+    response.headers["ETag"] = etag
+    return Service(**service)
+
+@api_router.put("/services/{service_id}/pricing", response_model=Service)
+async def update_service_pricing(service_id: str, pricing: PricingRules):
+    service = await db.services.find_one_and_update(
+        {"id": service_id},
+        {"$set": {"pricing": pricing.dict()}},
+        return_document=ReturnDocument.AFTER
+    )
+    if not service:
+        raise HTTPException(status_code=404, detail="Service not found")
+    service_catalog.invalidate()
+    await increment_rollup({}, changed=("services",))
+    return Service(**service)
+
+# Quotes
+@api_router.post("/quotes", response_model=QuoteResult)
+async def create_quote(lines: List[QuoteLine]):
+    if len(lines) > MAX_QUOTE_LINES:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_QUOTE_LINES} lines per quote")
+    
+    # Price every line in one pass with the same engine that prices bookings
+    services = await service_catalog.get_many({line.service_id for line in lines})
+    unit_prices, discounts, totals = pricing_engine.price(
+        services,
+        [line.service_id for line in lines],
+        [line.quantity for line in lines],
+        [line.customer_id for line in lines]
+    )
+    unit_prices, discounts, totals = unit_prices.tolist(), discounts.tolist(), totals.tolist()
+    
+    results = []
+    for index, line in enumerate(lines):
+        result = QuoteLineResult(index=index, **line.dict())
+        if line.service_id in services:
+            result.unit_price = unit_prices[index]
+            result.discount_percent = discounts[index]
+            result.total_price = totals[index]
+        else:
+            result.error = "Service not found"
+        results.append(result)
+    
+    successful = [result.total_price for result in results if result.error is None]
+    return QuoteResult(
+        total_price=round(sum(successful), 2),
+        successful=len(successful),
+        failed=len(results) - len(successful),
+        lines=results
+    )
 
 # Booking Management
 @api_router.post("/bookings", response_model=Booking)
@@ -182,68 +1758,408 @@ async def create_booking(booking: BookingCreate):
     if not customer:
         raise HTTPException(status_code=404, detail="Customer not found")
     
-    service = await db.services.find_one({"id": booking.service_id})
-    if not service:
+    service_obj = await service_catalog.get(booking.service_id)
+    if not service_obj:
         raise HTTPException(status_code=404, detail="Service not found")
     
     # Calculate total price and estimated delivery
-    service_obj = Service(**parse_from_mongo(service))
-    total_price = service_obj.base_price * booking.quantity
-    estimated_delivery = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
-    estimated_delivery = estimated_delivery.replace(day=estimated_delivery.day + service_obj.estimated_delivery_days)
+    total_price = pricing_engine.price_bookings([(booking, service_obj)])[0]
+    estimated_delivery = await delivery_calendar.estimate(service_obj.estimated_delivery_days)
+    booking_obj = build_booking(booking, total_price, estimated_delivery)
     
-    booking_obj = Booking(
-        **booking.dict(),
-        total_price=total_price,
-        estimated_delivery_date=estimated_delivery
+    booking_dict = booking_obj.dict()
+    try:
+        await db.bookings.insert_one(booking_dict)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=409, detail="Booking with this external_ref already exists")
+    await increment_rollup(booking_rollup_counts(booking_dict), changed=("bookings",))
+    booking_events.publish_local("created", [booking_dict])
+    return booking_obj
+
+@api_router.post("/bookings/batch", response_model=BookingBatchResult)
+async def create_bookings_batch(bookings: List[BookingCreate]):
+    if len(bookings) > MAX_BOOKING_BATCH_SIZE:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BOOKING_BATCH_SIZE} bookings per batch")
+    
+    # Validate every referenced customer with one $in query and services from the catalog
+    customer_ids = {booking.customer_id for booking in bookings}
+    existing_customers = set()
+    if customer_ids:
+        async for customer in db.customers.find({"id": {"$in": list(customer_ids)}}, {"id": 1}):
+            existing_customers.add(customer["id"])
+    services = await service_catalog.get_many({booking.service_id for booking in bookings})
+    
+    # Calculate total price and estimated delivery for the whole batch
+    results = []
+    booking_docs = []
+    booking_results = []
+    estimated_deliveries = await delivery_calendar.estimate_many(
+        service_obj.estimated_delivery_days for service_obj in services.values()
     )
+    pending = []
+    for index, booking in enumerate(bookings):
+        result = BookingBatchItemResult(index=index)
+        results.append(result)
+        if booking.customer_id not in existing_customers:
+            result.error = "Customer not found"
+            continue
+        service_obj = services.get(booking.service_id)
+        if not service_obj:
+            result.error = "Service not found"
+            continue
+        pending.append((result, booking, service_obj))
     
-    booking_dict = prepare_for_mongo(booking_obj.dict())
-    await db.bookings.insert_one(booking_dict)
-    return booking_obj
+    totals = pricing_engine.price_bookings([(booking, service_obj) for _, booking, service_obj in pending])
+    for (result, booking, service_obj), total_price in zip(pending, totals):
+        try:
+            result.booking = build_booking(booking, total_price, estimated_deliveries[service_obj.estimated_delivery_days])
+        except Exception as e:
+            result.error = str(e)
+            continue
+        booking_docs.append(result.booking.dict())
+        booking_results.append(result)
+    
+    # Write the batch with one unordered insert_many
+    if booking_docs:
+        try:
+            await db.bookings.insert_many(booking_docs, ordered=False)
+        except BulkWriteError as e:
+            for write_error in e.details.get("writeErrors", []):
+                result = booking_results[write_error["index"]]
+                result.booking = None
+                result.error = write_error["errmsg"]
+    
+    successful = sum(1 for result in results if result.booking)
+    await increment_rollup({
+        "total_bookings": successful,
+        f"status_counts.{BookingStatus.PENDING.value}": successful
+    }, changed=("bookings",) if successful else ())
+    booking_events.publish_local("created", (result.booking.dict() for result in results if result.booking))
+    return BookingBatchResult(successful=successful, failed=len(results) - successful, results=results)
 
-@api_router.get("/bookings", response_model=List[Booking])
-async def get_bookings(status: Optional[BookingStatus] = None):
+def date_range(start=None, end=None):
+    """Half-open [start, end) range condition, or None when neither bound is given"""
+    condition = {}
+    if start:
+        condition["$gte"] = start
+    if end:
+        condition["$lt"] = end
+    return condition or None
+
+def booking_filter(
+    status: Optional[BookingStatus] = None,
+    customer_id: Optional[str] = None,
+    service_id: Optional[str] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    estimated_from: Optional[datetime] = None,
+    estimated_to: Optional[datetime] = None
+):
+    """Mongo filter shared by the bookings list and export endpoints"""
     filter_query = {}
     if status:
         filter_query["status"] = status.value
+    if customer_id:
+        filter_query["customer_id"] = customer_id
+    if service_id:
+        filter_query["service_id"] = service_id
+    created_range = date_range(created_from, created_to)
+    if created_range:
+        filter_query["created_at"] = created_range
+    estimated_range = date_range(estimated_from, estimated_to)
+    if estimated_range:
+        filter_query["estimated_delivery_date"] = estimated_range
+    return filter_query
+
+# Bookings list shapes backed by a (filter, sort, id) index in INDEXES: at most one equality
+# filter, and a date range only on the field the page is sorted by
+BOOKING_EQUALITY_FILTERS = ("status", "customer_id", "service_id")
+BOOKING_RANGE_PARAMETERS = {"created_at": "created_from/created_to", "estimated_delivery_date": "estimated_from/estimated_to"}
+
+def check_booking_query_shape(filter_query, sort_field):
+    """Reject bookings list filters that no single index can serve in the requested order"""
+    equality_filters = [name for name in BOOKING_EQUALITY_FILTERS if name in filter_query]
+    if len(equality_filters) > 1:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Filter by at most one of {', '.join(BOOKING_EQUALITY_FILTERS)}, got {', '.join(equality_filters)}"
+        )
+    for field, parameters in BOOKING_RANGE_PARAMETERS.items():
+        if field in filter_query and field != sort_field:
+            raise HTTPException(
+                status_code=400,
+                detail=f"{parameters} can only be used with sort={field} or sort=-{field}"
+            )
+
+async def expand_bookings(docs, expand):
+    """Attach the referenced customer and service to each booking with one lookup per kind"""
+    if "customer" in expand:
+        customer_ids = {doc["customer_id"] for doc in docs}
+        customers = {}
+        if customer_ids:
+            defaults = response_defaults(Customer)
+            async for customer in db.customers.find({"id": {"$in": list(customer_ids)}}, response_projection(Customer)):
+                customers[customer["id"]] = {**defaults, **customer}
+        for doc in docs:
+            doc["customer"] = customers.get(doc["customer_id"])
+    if "service" in expand:
+        services = await service_catalog.get_many({doc["service_id"] for doc in docs})
+        service_dicts = {service_id: service_obj.dict() for service_id, service_obj in services.items()}
+        for doc in docs:
+            doc["service"] = service_dicts.get(doc["service_id"])
+
+@api_router.get("/bookings", response_model=List[Booking])
+async def get_bookings(
+    filter_query: dict = Depends(booking_filter),
+    sort: BookingSort = BookingSort.CREATED_AT,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    stream: bool = False,
+    fields: Optional[str] = None,
+    expand: Optional[str] = None,
+    if_none_match: Optional[str] = Header(None)
+):
+    fields = parse_name_list(fields, Booking.model_fields, "fields")
+    expand = parse_name_list(expand, BOOKING_EXPANSIONS, "expand")
+    sort_field = sort.value.lstrip("-")
+    # Only shapes with a (filter, sort, id) index in INDEXES are accepted, so each page is a
+    # range scan over one index
+    check_booking_query_shape(filter_query, sort_field)
+    etag = await collection_etag("bookings", *(f"{name}s" for name in expand or ()))
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    response = await paginate(
+        db.bookings, Booking, filter_query, limit=limit, cursor=cursor, stream=stream,
+        sort_field=sort_field, descending=sort.value.startswith("-"), fields=fields,
+        expand=expand and (lambda docs: expand_bookings(docs, expand)),
+        expand_fields=[BOOKING_EXPANSIONS[name] for name in expand or ()]
+    )
+    response.headers["ETag"] = etag
+    return response
+
+@api_router.get("/bookings/export")
+async def export_bookings(
+    format: ExportFormat = ExportFormat.CSV,
+    filter_query: dict = Depends(booking_filter)
+):
+    if format == ExportFormat.PARQUET and pa is None:
+        raise HTTPException(status_code=501, detail="Parquet export requires pyarrow to be installed")
+    
+    batches = export_batches(filter_query)
+    filename = f"bookings.{format.value}"
+    headers = {"Content-Disposition": f'attachment; filename="{filename}"'}
+    
+    if format == ExportFormat.CSV:
+        return StreamingResponse(export_csv_chunks(batches), media_type="text/csv", headers=headers)
+    
+    if format == ExportFormat.XLSX:
+        spooled = await spool_xlsx(batches)
+        media_type = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+    else:
+        spooled = await spool_parquet(batches)
+        media_type = "application/vnd.apache.parquet"
+    return StreamingResponse(spooled_file_chunks(spooled), media_type=media_type, headers=headers)
+
+@api_router.get("/bookings/stream")
+async def stream_booking_events():
+    # Server-Sent Events: each message is a created/updated booking, or a reset asking the
+    # client to reload the list. Every subscription starts with a reset, since events sent
+    # while a client was reconnecting are gone; a client also gets one when it falls too far behind
+    queue = booking_events.subscribe()
+    
+    async def event_messages():
+        try:
+            yield b"retry: 3000\n\n" + booking_events.reset_message()
+            while True:
+                try:
+                    yield await asyncio.wait_for(queue.get(), SSE_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield b": keep-alive\n\n"
+        finally:
+            booking_events.unsubscribe(queue)
     
-    bookings = await db.bookings.find(filter_query).to_list(1000)
-    return [Booking(**parse_from_mongo(booking)) for booking in bookings]
+    return StreamingResponse(
+        event_messages(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 @api_router.get("/bookings/{booking_id}", response_model=Booking)
-async def get_booking(booking_id: str):
+async def get_booking(booking_id: str, response: Response, if_none_match: Optional[str] = Header(None)):
     booking = await db.bookings.find_one({"id": booking_id})
     if not booking:
         raise HTTPException(status_code=404, detail="Booking not found")
-    return Booking(**parse_from_mongo(booking))
+    etag = version_etag(booking.get("version", 0))
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    response.headers["ETag"] = etag
+    return Booking(**booking)
 
 @api_router.put("/bookings/{booking_id}", response_model=Booking)
-async def update_booking(booking_id: str, booking_update: BookingUpdate):
-    booking = await db.bookings.find_one({"id": booking_id})
+async def update_booking(
+    booking_id: str,
+    booking_update: BookingUpdate,
+    response: Response,
+    if_match: Optional[str] = Header(None)
+):
+    expected_version = booking_update.version
+    header_version = parse_version_etag(if_match) if if_match is not None else None
+    if header_version is not None:
+        if expected_version is not None and expected_version != header_version:
+            raise HTTPException(status_code=400, detail="Body version and If-Match disagree")
+        expected_version = header_version
+    
+    update_data = {k: v for k, v in booking_update.dict(exclude={"version"}).items() if v is not None}
+    update_data["updated_at"] = datetime.now(timezone.utc)
+    if booking_update.actual_delivery_date and booking_update.actual_delivery_date.tzinfo:
+        # Delivery days are counted on UTC calendar days, like the stored dates
+        update_data["actual_delivery_date"] = booking_update.actual_delivery_date.astimezone(timezone.utc)
+    
+    filter_query = {"id": booking_id}
+    if expected_version is not None:
+        # Bookings written before versioning have no version field and count as version 0
+        filter_query["version"] = expected_version if expected_version else {"$in": [0, None]}
+    
+    delivered = booking_update.status == BookingStatus.DELIVERED and booking_update.actual_delivery_date
+    if delivered:
+        # Delivery performance depends on the stored creation and estimate dates, so compute it
+        # in an update pipeline and keep the whole change one atomic round trip
+        # Field paths see the document as it was before the update, so the new delivery date
+        # is passed in as a literal
+        days = {
+            "estimated": mongo_days_between("$created_at", "$estimated_delivery_date"),
+            "actual": mongo_days_between("$created_at", {"$literal": update_data["actual_delivery_date"]})
+        }
+        update = [{"$set": {
+            **{key: {"$literal": value} for key, value in update_data.items()},
+            "version": {"$add": [{"$ifNull": ["$version", 0]}, 1]},
+            "delivery_variance_days": {"$let": {"vars": days, "in": {"$subtract": ["$$actual", "$$estimated"]}}},
+            "delivered_on_time": {"$let": {"vars": days, "in": {"$lte": ["$$actual", "$$estimated"]}}}
+        }}]
+    else:
+        update = {"$set": update_data, "$inc": {"version": 1}}
+    
+    # Apply the update atomically; the pre-image gives the exact state the update was applied to
+    booking = await db.bookings.find_one_and_update(filter_query, update, return_document=ReturnDocument.BEFORE)
     if not booking:
+        if expected_version is not None and await db.bookings.count_documents({"id": booking_id}, limit=1):
+            if header_version is not None:
+                raise HTTPException(status_code=412, detail="Booking was modified by another request")
+            raise HTTPException(status_code=409, detail="Booking was modified by another request")
         raise HTTPException(status_code=404, detail="Booking not found")
     
-    update_data = {k: v for k, v in booking_update.dict().items() if v is not None}
-    update_data["updated_at"] = datetime.now(timezone.utc)
+    if delivered:
+        # The same figures the pipeline stored, from the pre-image it was applied to
+        update_data.update(delivery_performance_fields(
+            booking["created_at"], booking["estimated_delivery_date"], update_data["actual_delivery_date"]
+        ))
+    updated_booking = {**booking, **update_data, "version": booking.get("version", 0) + 1}
+    await increment_rollup(booking_rollup_delta(booking, updated_booking), changed=("bookings",))
+    booking_events.publish_local("updated", [updated_booking])
     
-    # Calculate delivery performance if marking as delivered
-    if booking_update.status == BookingStatus.DELIVERED and booking_update.actual_delivery_date:
-        booking_obj = Booking(**parse_from_mongo(booking))
-        estimated_days = (booking_obj.estimated_delivery_date.date() - booking_obj.created_at.date()).days
-        actual_days = (booking_update.actual_delivery_date.date() - booking_obj.created_at.date()).days
-        update_data["delivery_variance_days"] = actual_days - estimated_days
-        update_data["delivered_on_time"] = actual_days <= estimated_days
+    response.headers["ETag"] = version_etag(updated_booking["version"])
+    return Booking(**updated_booking)
+
+@api_router.post("/bookings/batch/status", response_model=BookingStatusUpdateBatchResult)
+async def update_booking_statuses(updates: List[BookingStatusUpdate]):
+    if len(updates) > MAX_STATUS_UPDATE_BATCH_SIZE:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_STATUS_UPDATE_BATCH_SIZE} status updates per batch")
     
-    prepare_for_mongo(update_data)
-    await db.bookings.update_one({"id": booking_id}, {"$set": update_data})
+    # Load every referenced booking with one $in query
+    booking_ids = {update.booking_id for update in updates}
+    bookings = {}
+    if booking_ids:
+        async for booking in db.bookings.find({"id": {"$in": list(booking_ids)}}):
+            bookings[booking["id"]] = booking
     
-    updated_booking = await db.bookings.find_one({"id": booking_id})
-    return Booking(**parse_from_mongo(updated_booking))
+    results = []
+    operations = []
+    pending = []
+    seen = set()
+    now = datetime.now(timezone.utc)
+    # Every booking this batch writes carries its token, so a re-read can tell exactly which
+    # operations were applied
+    batch_token = uuid.uuid4().hex
+    for update in updates:
+        result = BookingStatusUpdateResult(booking_id=update.booking_id)
+        results.append(result)
+        if update.booking_id in seen:
+            result.error = "Duplicate booking id in batch"
+            continue
+        seen.add(update.booking_id)
+        booking = bookings.get(update.booking_id)
+        if not booking:
+            result.error = "Booking not found"
+            continue
+        
+        update_data = {"status": update.status, "updated_at": now, "status_batch": batch_token}
+        if update.actual_delivery_date:
+            update_data["actual_delivery_date"] = update.actual_delivery_date
+        
+        # Calculate delivery performance the same way as update_booking
+        try:
+            if update.status == BookingStatus.DELIVERED and update.actual_delivery_date:
+                update_data.update(delivery_performance_fields(
+                    booking["created_at"], booking["estimated_delivery_date"], update.actual_delivery_date
+                ))
+        except Exception as e:
+            result.error = str(e)
+            continue
+        
+        # Only apply the change to the version that was read, the same precondition as update_booking
+        version = booking.get("version", 0)
+        filter_query = {"id": update.booking_id, "version": version if version else {"$in": [0, None]}}
+        operations.append(UpdateOne(filter_query, {"$set": update_data, "$inc": {"version": 1}}))
+        pending.append((result, booking, update_data))
+    
+    # Apply every change with one unordered bulk_write
+    failed_operations = set()
+    matched = 0
+    if operations:
+        try:
+            matched = (await db.bookings.bulk_write(operations, ordered=False)).matched_count
+        except BulkWriteError as e:
+            matched = e.details.get("nMatched", 0)
+            for write_error in e.details.get("writeErrors", []):
+                failed_operations.add(write_error["index"])
+                pending[write_error["index"]][0].error = write_error["errmsg"]
+    
+    # Operations whose version precondition did not match lost a race with another writer;
+    # the bookings still carrying this batch's token are the ones that were applied
+    attempted = len(pending) - len(failed_operations)
+    if matched < attempted:
+        applied_ids = set()
+        async for booking in db.bookings.find(
+            {"id": {"$in": [result.booking_id for result, _, _ in pending]}, "status_batch": batch_token}, {"id": 1}
+        ):
+            applied_ids.add(booking["id"])
+        if len(applied_ids) != matched:
+            # Only a later status batch, which read our write, can have replaced the token
+            logger.warning(f"Status batch {batch_token}: {matched} applied but {len(applied_ids)} still carry the token")
+        for position, (result, _, _) in enumerate(pending):
+            if position not in failed_operations and result.booking_id not in applied_ids:
+                failed_operations.add(position)
+                result.error = "Booking was modified by another request"
+    
+    rollup_delta = {}
+    updated_bookings = []
+    for position, (result, booking, update_data) in enumerate(pending):
+        if position in failed_operations:
+            continue
+        result.updated = True
+        updated_booking = {**booking, **update_data, "version": booking.get("version", 0) + 1}
+        updated_bookings.append(updated_booking)
+        for key, value in booking_rollup_delta(booking, updated_booking).items():
+            rollup_delta[key] = rollup_delta.get(key, 0) + value
+    
+    successful = sum(1 for result in results if result.updated)
+    await increment_rollup(rollup_delta, changed=("bookings",) if successful else ())
+    booking_events.publish_local("updated", updated_bookings)
+    return BookingStatusUpdateBatchResult(successful=successful, failed=len(results) - successful, results=results)
 
 # File Upload for Bulk Booking Import
-@api_router.post("/upload/bookings", response_model=FileUploadResult)
-async def upload_bookings(file: UploadFile = File(...)):
+@api_router.post("/upload/bookings", response_model=FileUploadResult, responses={202: {"model": ImportJob}})
+async def upload_bookings(file: UploadFile = File(...), background: bool = False):
     if not file.filename.endswith(('.csv', '.xlsx', '.xls')):
         raise HTTPException(status_code=400, detail="Only CSV and Excel files are supported")
     
@@ -251,15 +2167,12 @@ async def upload_bookings(file: UploadFile = File(...)):
         # Read file content
         content = await file.read()
         
-        # Parse based on file type
-        if file.filename.endswith('.csv'):
-            df = pd.read_csv(io.StringIO(content.decode('utf-8')))
-        else:
-            df = pd.read_excel(io.BytesIO(content))
+        # Check the header before any rows are imported
+        columns = await parse_upload_columns(file.filename, content)
         
         # Expected columns: customer_name, customer_email, service_name, quantity, notes
         required_columns = ['customer_name', 'customer_email', 'service_name']
-        missing_columns = [col for col in required_columns if col not in df.columns]
+        missing_columns = [col for col in required_columns if col not in columns]
         
         if missing_columns:
             raise HTTPException(
@@ -267,152 +2180,289 @@ async def upload_bookings(file: UploadFile = File(...)):
                 detail=f"Missing required columns: {missing_columns}"
             )
         
-        successful_imports = 0
-        failed_imports = 0
-        errors = []
+        if background and len(import_job_tasks) >= MAX_CONCURRENT_IMPORT_JOBS + MAX_QUEUED_IMPORT_JOBS:
+            raise HTTPException(status_code=429, detail="Too many import jobs in progress, retry later")
         
-        for index, row in df.iterrows():
-            try:
-                # Find or create customer
-                customer = await db.customers.find_one({"email": row['customer_email']})
-                if not customer:
-                    customer_data = CustomerCreate(
-                        name=row['customer_name'],
-                        email=row['customer_email']
-                    )
-                    customer_obj = Customer(**customer_data.dict())
-                    customer_dict = prepare_for_mongo(customer_obj.dict())
-                    await db.customers.insert_one(customer_dict)
-                    customer_id = customer_obj.id
-                else:
-                    customer_id = customer['id']
-                
-                # Find service
-                service = await db.services.find_one({"name": row['service_name']})
-                if not service:
-                    errors.append(f"Row {index + 1}: Service '{row['service_name']}' not found")
-                    failed_imports += 1
-                    continue
-                
-                # Create booking
-                booking_data = BookingCreate(
-                    customer_id=customer_id,
-                    service_id=service['id'],
-                    quantity=int(row.get('quantity', 1)),
-                    notes=row.get('notes', '')
-                )
-                
-                # Calculate booking details
-                service_obj = Service(**parse_from_mongo(service))
-                total_price = service_obj.base_price * booking_data.quantity
-                estimated_delivery = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
-                estimated_delivery = estimated_delivery.replace(day=estimated_delivery.day + service_obj.estimated_delivery_days)
-                
-                booking_obj = Booking(
-                    **booking_data.dict(),
-                    total_price=total_price,
-                    estimated_delivery_date=estimated_delivery
-                )
-                
-                booking_dict = prepare_for_mongo(booking_obj.dict())
-                await db.bookings.insert_one(booking_dict)
-                successful_imports += 1
-                
-            except Exception as e:
-                errors.append(f"Row {index + 1}: {str(e)}")
-                failed_imports += 1
+        # A file that was imported before returns its stored result instead of importing again
+        loop = asyncio.get_running_loop()
+        fingerprint = await loop.run_in_executor(upload_parse_executor, upload_fingerprint, content)
+        job = ImportJob(filename=file.filename) if background else None
+        # A background import holds its claim under the job id so the job can renew it
+        claim_id = job.id if job else str(uuid.uuid4())
+        previous = await claim_import_fingerprint(fingerprint, file.filename, claim_id, job and job.id)
+        if previous is not None:
+            if previous.get("result"):
+                return stored_import_result(previous)
+            if background and previous.get("job_id"):
+                previous_job = await db.import_jobs.find_one({"id": previous["job_id"]}, {"_id": 0})
+                if previous_job:
+                    return JSONResponse(status_code=202, content=jsonable_encoder(ImportJob(**previous_job)))
+            raise HTTPException(status_code=409, detail="This file is already being imported")
         
-        return FileUploadResult(
-            filename=file.filename,
-            records_processed=len(df),
-            successful_imports=successful_imports,
-            failed_imports=failed_imports,
-            errors=errors
-        )
+        if background:
+            await db.import_jobs.insert_one(job.dict())
+            task = asyncio.create_task(run_import_job(job.id, file.filename, content, fingerprint))
+            import_job_tasks.add(task)
+            task.add_done_callback(import_job_tasks.discard)
+            return JSONResponse(status_code=202, content=jsonable_encoder(job))
+        
+        async def renew_claim(*progress):
+            await renew_import_fingerprint(fingerprint, claim_id)
         
+        result = None
+        try:
+            result = await import_bookings(file.filename, parse_upload_chunks(file.filename, content), renew_claim)
+        finally:
+            await complete_import_fingerprint(fingerprint, claim_id, result)
+        return result
+        
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing file: {str(e)}")
 
+@api_router.get("/upload/jobs/{job_id}", response_model=ImportJob)
+async def get_import_job(job_id: str):
+    job = await db.import_jobs.find_one({"id": job_id})
+    if not job:
+        raise HTTPException(status_code=404, detail="Import job not found")
+    return ImportJob(**job)
+
 # Analytics Endpoints
-@api_router.get("/analytics/delivery-performance")
-async def get_delivery_performance():
-    # Get delivered bookings with actual delivery dates
-    delivered_bookings = await db.bookings.find({
-        "status": "delivered",
-        "actual_delivery_date": {"$exists": True}
-    }).to_list(1000)
-    
-    performance_data = []
-    
-    for booking in delivered_bookings:
-        try:
-            # Get the service details
-            service = await db.services.find_one({"id": booking["service_id"]})
-            if not service:
-                continue
-            
-            # Parse dates
-            booking_obj = Booking(**parse_from_mongo(booking))
-            service_obj = Service(**parse_from_mongo(service))
-            
-            # Calculate actual days from creation to delivery
-            actual_days = (booking_obj.actual_delivery_date.date() - booking_obj.created_at.date()).days
-            estimated_days = service_obj.estimated_delivery_days
-            variance_days = actual_days - estimated_days
-            on_time = actual_days <= estimated_days
-            
-            performance_data.append({
-                "booking_id": booking_obj.id,
-                "estimated_days": estimated_days,
-                "actual_days": actual_days,
-                "variance_days": variance_days,
-                "on_time": on_time
-            })
-            
-        except Exception as e:
-            # Skip problematic records
-            continue
+@api_router.get("/analytics/delivery-performance", response_model=DeliveryPerformanceReport)
+async def get_delivery_performance(
+    response: Response,
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    if_none_match: Optional[str] = Header(None)
+):
+    etag = await collection_etag("bookings")
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    response.headers["ETag"] = etag
+    page_filter = decode_cursor(cursor) if cursor else {}
+    delivered = {"status": "delivered", "actual_delivery_date": {"$exists": True}}
     
-    return performance_data
-
-@api_router.get("/analytics/overview")
-async def get_analytics_overview():
-    # Get booking counts by status
-    status_counts = await db.bookings.aggregate([
-        {"$group": {"_id": "$status", "count": {"$sum": 1}}}
-    ]).to_list(10)
+    # Do the date arithmetic in MongoDB, on the same calendar-day basis as delivery_performance_fields;
+    # the estimate comes from the booking's own estimated_delivery_date since the service's
+    # estimated_delivery_days now counts working days
+    performance = {
+        "$project": {
+            "_id": 0,
+            "id": 1,
+            "created_at": 1,
+            "booking_id": "$id",
+            "estimated_days": mongo_days_between("$created_at", "$estimated_delivery_date"),
+            "actual_days": mongo_days_between("$created_at", "$actual_delivery_date")
+        }
+    }
+    variance = {
+        "$addFields": {
+            "variance_days": {"$subtract": ["$actual_days", "$estimated_days"]},
+            "on_time": {"$lte": ["$actual_days", "$estimated_days"]}
+        }
+    }
     
-    # Get on-time delivery rate
-    delivery_stats = await db.bookings.aggregate([
-        {
-            "$match": {
-                "status": "delivered",
-                "delivered_on_time": {"$exists": True}
-            }
-        },
+    # The summary covers every delivery; the page is a separate query so its match, sort and
+    # limit run on the status_created_at_id index before any date arithmetic
+    summary_pipeline = [
+        {"$match": delivered},
+        performance,
+        variance,
         {
             "$group": {
                 "_id": None,
-                "total_delivered": {"$sum": 1},
-                "on_time_deliveries": {
-                    "$sum": {"$cond": [{"$eq": ["$delivered_on_time", True]}, 1, 0]}
-                }
+                "total_deliveries": {"$sum": 1},
+                "on_time_deliveries": {"$sum": {"$cond": ["$on_time", 1, 0]}},
+                "average_actual_days": {"$avg": "$actual_days"},
+                "average_variance_days": {"$avg": "$variance_days"}
             }
         }
-    ]).to_list(1)
+    ]
+    page_pipeline = [
+        {"$match": {**delivered, **page_filter}},
+        {"$sort": {"created_at": 1, "id": 1}},
+        {"$limit": limit + 1},
+        performance,
+        variance
+    ]
+    summary_rows, deliveries = await asyncio.gather(
+        db.bookings.aggregate(summary_pipeline).to_list(1),
+        db.bookings.aggregate(page_pipeline).to_list(None)
+    )
+    
+    summary = DeliveryPerformanceSummary()
+    if summary_rows:
+        stats = summary_rows[0]
+        summary = DeliveryPerformanceSummary(
+            total_deliveries=stats["total_deliveries"],
+            on_time_deliveries=stats["on_time_deliveries"],
+            on_time_rate=round(stats["on_time_deliveries"] / stats["total_deliveries"] * 100, 2),
+            average_actual_days=round(stats["average_actual_days"], 2),
+            average_variance_days=round(stats["average_variance_days"], 2)
+        )
+    
+    next_cursor = None
+    if len(deliveries) > limit:
+        deliveries = deliveries[:limit]
+        next_cursor = encode_cursor(deliveries[-1])
+    
+    return DeliveryPerformanceReport(
+        summary=summary,
+        deliveries=[DeliveryPerformance(**row) for row in deliveries],
+        next_cursor=next_cursor
+    )
+
+@api_router.get("/analytics/overview")
+async def get_analytics_overview(response: Response, if_none_match: Optional[str] = Header(None)):
+    rollup = await db.analytics_rollups.find_one({"_id": OVERVIEW_ROLLUP_ID})
+    if not rollup:
+        rollup = await rebuild_analytics_rollup()
+    
+    # The counters come from the same document as the figures, so the ETag is free here
+    etag = rollup_etag(rollup, "customers", "services", "bookings")
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    response.headers["ETag"] = etag
     
     on_time_rate = 0
-    if delivery_stats:
-        on_time_rate = (delivery_stats[0]["on_time_deliveries"] / delivery_stats[0]["total_delivered"]) * 100
+    if rollup.get("total_delivered"):
+        on_time_rate = (rollup.get("on_time_deliveries", 0) / rollup["total_delivered"]) * 100
     
     return {
-        "status_counts": {item["_id"]: item["count"] for item in status_counts},
+        "status_counts": {status: count for status, count in rollup.get("status_counts", {}).items() if count},
         "on_time_delivery_rate": round(on_time_rate, 2),
-        "total_customers": await db.customers.count_documents({}),
-        "total_services": await db.services.count_documents({}),
-        "total_bookings": await db.bookings.count_documents({})
+        "total_customers": rollup.get("total_customers", 0),
+        "total_services": rollup.get("total_services", 0),
+        "total_bookings": rollup.get("total_bookings", 0)
     }
 
+@api_router.get("/analytics/timeseries", response_model=List[TimeseriesPoint])
+async def get_analytics_timeseries(
+    response: Response,
+    bucket: TimeBucket = TimeBucket.DAY,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    by_service: bool = False,
+    if_none_match: Optional[str] = Header(None)
+):
+    etag = await collection_etag("bookings", *(("services",) if by_service else ()))
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    response.headers["ETag"] = etag
+    # Range on created_at is served by the created_at_id index
+    match = {}
+    if start or end:
+        match["created_at"] = {}
+        if start:
+            match["created_at"]["$gte"] = start
+        if end:
+            match["created_at"]["$lt"] = end
+    
+    truncate = {"date": "$created_at", "unit": bucket.value}
+    if bucket == TimeBucket.WEEK:
+        truncate["startOfWeek"] = "monday"
+    group_id = {"bucket": {"$dateTrunc": truncate}}
+    if by_service:
+        group_id["service_id"] = "$service_id"
+    
+    is_delivered = {
+        "$and": [
+            {"$eq": ["$status", BookingStatus.DELIVERED.value]},
+            {"$eq": [{"$type": "$delivered_on_time"}, "bool"]}
+        ]
+    }
+    pipeline = [
+        {"$match": match},
+        {
+            "$group": {
+                "_id": group_id,
+                "bookings": {"$sum": 1},
+                "revenue": {"$sum": "$total_price"},
+                "delivered": {"$sum": {"$cond": [is_delivered, 1, 0]}},
+                "on_time": {
+                    "$sum": {"$cond": [{"$and": [is_delivered, {"$eq": ["$delivered_on_time", True]}]}, 1, 0]}
+                }
+            }
+        },
+        {"$sort": {"_id.bucket": 1, "_id.service_id": 1}}
+    ]
+    
+    points = []
+    async for row in db.bookings.aggregate(pipeline):
+        points.append(TimeseriesPoint(
+            bucket=row["_id"]["bucket"],
+            service_id=row["_id"].get("service_id"),
+            bookings=row["bookings"],
+            revenue=round(row["revenue"], 2),
+            delivered=row["delivered"],
+            on_time_delivery_rate=round(row["on_time"] / row["delivered"] * 100, 2) if row["delivered"] else None
+        ))
+    return points
+
+# Admin Endpoints
+@api_router.get("/admin/indexes")
+async def get_index_report():
+    report = []
+    for collection_name, label, filter_query, sort in HOT_QUERIES:
+        entry = {"collection": collection_name, "query": label}
+        try:
+            cursor = db[collection_name].find(filter_query)
+            if sort:
+                cursor = cursor.sort(sort)
+            explain = await cursor.explain()
+            winning_plan = explain.get("queryPlanner", {}).get("winningPlan", {})
+            stages = plan_stages(winning_plan)
+            entry["stages"] = stages
+            entry["indexes_used"] = plan_index_names(winning_plan)
+            entry["collscan"] = "COLLSCAN" in stages
+        except Exception as e:
+            entry["error"] = str(e)
+        report.append(entry)
+
+    existing = {}
+    for collection_name in INDEXES:
+        existing[collection_name] = sorted((await db[collection_name].index_information()).keys())
+
+    return {
+        "queries": report,
+        "collscan_queries": sum(1 for entry in report if entry.get("collscan")),
+        "indexes": existing
+    }
+
+@api_router.get("/admin/holidays", response_model=List[Holiday])
+async def get_holidays():
+    holidays = await db.delivery_holidays.find({}, {"_id": 0}).sort("date", 1).to_list(None)
+    return [Holiday(day=holiday["date"].date(), name=holiday.get("name")) for holiday in holidays]
+
+@api_router.put("/admin/holidays", response_model=Holiday)
+async def put_holiday(holiday: Holiday):
+    await db.delivery_holidays.update_one(
+        {"date": holiday_datetime(holiday.day)}, {"$set": {"name": holiday.name}}, upsert=True
+    )
+    delivery_calendar.invalidate()
+    return holiday
+
+@api_router.delete("/admin/holidays/{day}")
+async def delete_holiday(day: date):
+    result = await db.delivery_holidays.delete_one({"date": holiday_datetime(day)})
+    if not result.deleted_count:
+        raise HTTPException(status_code=404, detail="Holiday not found")
+    delivery_calendar.invalidate()
+    return {"deleted": day}
+
+@api_router.post("/admin/rollups/rebuild")
+async def rebuild_rollups():
+    rollup = await rebuild_analytics_rollup()
+    for key in ("_id", "epoch", "versions"):
+        rollup.pop(key, None)
+    return rollup
+
+# Metrics
+@api_router.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 # Include the router in the main app
 app.include_router(api_router)
 
@@ -422,6 +2472,7 @@ app.add_middleware(
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, "ETag"],
 )
 
 # Configure logging
@@ -431,6 +2482,50 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@app.middleware("http")
+async def record_request_metrics(request, call_next):
+    commands = []
+    token = current_request_commands.set(commands)
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        elapsed = time.perf_counter() - started
+        current_request_commands.reset(token)
+        # Label by route template so path parameters do not explode the series count
+        route = request.scope.get("route")
+        route_path = route.path if route else "unmatched"
+        metrics.observe_request(request.method, route_path, status, elapsed, commands)
+        if SLOW_REQUEST_MS and elapsed * 1000 >= SLOW_REQUEST_MS:
+            breakdown = defaultdict(lambda: [0, 0.0])
+            for name, seconds in commands:
+                breakdown[name][0] += 1
+                breakdown[name][1] += seconds
+            detail = ", ".join(f"{name} x{count} {seconds * 1000:.1f} ms" for name, (count, seconds) in breakdown.items())
+            logger.warning(
+                f"Slow request {request.method} {route_path} {status}: {elapsed * 1000:.1f} ms, "
+                f"{len(commands)} mongo commands ({detail or 'none'})"
+            )
+
+@app.on_event("startup")
+async def create_db_indexes():
+    await ensure_indexes()
+    # Keyset cursors and the $dateTrunc pipelines assume native dates, so convert before serving
+    await migrate_string_dates()
+    await backfill_customer_search_fields()
+    await fail_interrupted_import_jobs()
+    # Seed the rollup from existing data before any write starts incrementing it
+    if not await db.analytics_rollups.find_one({"_id": OVERVIEW_ROLLUP_ID}):
+        await rebuild_analytics_rollup()
+    global booking_watch_task
+    booking_watch_task = asyncio.create_task(watch_booking_changes())
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+    if booking_watch_task:
+        booking_watch_task.cancel()
+    client.close()
+    upload_parse_executor.shutdown(wait=False, cancel_futures=True)
\ No newline at end of file
@@ -0,0 +1,348 @@
+"""Latency and throughput benchmark for every endpoint in backend/server.py.
+
+The app is driven in-process through httpx's ASGI transport against a local
+MongoDB (or mongomock with --in-memory), after seeding it with a deterministic
+dataset from datagen.py. Each endpoint reports p50/p95/p99 latency and
+throughput, the upload endpoint reports rows per second for CSV and XLSX
+manifests, and everything is written as JSON so runs can be compared:
+
+    python benchmarks/api_bench.py --output results.json
+    python benchmarks/api_bench.py --output new.json --compare results.json
+"""
+from pathlib import Path
+from datetime import date, datetime, timedelta, timezone
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of an unsorted list"""
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    rank = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered) + 0.5) - 1))
+    return ordered[rank]
+
+
+def summarize(latencies, wall_seconds, errors, first_error):
+    ms = [latency * 1000 for latency in latencies]
+    return {
+        "requests": len(latencies) + errors,
+        "errors": errors,
+        "first_error": first_error,
+        "p50_ms": percentile(ms, 50),
+        "p95_ms": percentile(ms, 95),
+        "p99_ms": percentile(ms, 99),
+        "mean_ms": sum(ms) / len(ms) if ms else None,
+        "throughput_rps": round(len(latencies) / wall_seconds, 2) if wall_seconds else None,
+    }
+
+
+async def run_endpoint(client, make_request, iterations, concurrency):
+    """Issue `iterations` requests with at most `concurrency` in flight"""
+    latencies = []
+    errors = 0
+    first_error = None
+    slots = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        nonlocal errors, first_error
+        async with slots:
+            started = time.perf_counter()
+            try:
+                response = await make_request(client, i)
+                failed = response.status_code >= 400
+                error = None if not failed else f"HTTP {response.status_code}: {response.text[:200]}"
+            except Exception as e:
+                failed, error = True, f"{type(e).__name__}: {e}"[:200]
+            elapsed = time.perf_counter() - started
+            if failed:
+                errors += 1
+                first_error = first_error or error
+            else:
+                latencies.append(elapsed)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(iterations)))
+    return summarize(latencies, time.perf_counter() - started, errors, first_error)
+
+
+# mongomock cannot evaluate these endpoints' pipelines (it has no $dateTrunc), so --in-memory
+# runs list them as skipped rather than failed
+IN_MEMORY_UNSUPPORTED = {
+    "GET /api/analytics/delivery-performance": "mongomock has no $dateTrunc",
+    "GET /api/analytics/timeseries": "mongomock has no $dateTrunc",
+}
+
+
+async def open_booking_stream():
+    """GET /api/bookings/stream up to its opening reset event.
+
+    httpx's ASGI transport waits for the whole body, which an event stream never finishes,
+    so the route is called directly and closed after its first message.
+    """
+    import server
+    response = await server.stream_booking_events()
+    try:
+        first = await response.body_iterator.__anext__()
+    finally:
+        await response.body_iterator.aclose()
+    if b"event: reset" not in first:
+        raise RuntimeError(f"unexpected first message {first[:100]!r}")
+    return response
+
+
+async def run_background_upload(client, content):
+    """POST /api/upload/bookings?background=true and poll the job until it finishes"""
+    response = await client.post("/api/upload/bookings", params={"background": "true"}, files={"file": ("bg.csv", content)})
+    if response.status_code != 202:
+        return response
+    job_url = f"/api/upload/jobs/{response.json()['id']}"
+    while True:
+        response = await client.get(job_url)
+        if response.status_code >= 400:
+            return response
+        status = response.json()["status"]
+        if status == "failed":
+            raise RuntimeError(response.json()["error"])
+        if status == "completed":
+            return response
+        await asyncio.sleep(0.01)
+
+
+def build_endpoints(dataset, rng):
+    """(name, request factory) for every endpoint, using ids from the seeded dataset"""
+    from datagen import generate_manifest_rows, manifest_csv_bytes
+
+    customer_ids = [customer["id"] for customer in dataset["customers"]]
+    customer_names = [customer["name"] for customer in dataset["customers"]]
+    service_ids = [service["id"] for service in dataset["services"]]
+    booking_ids = [booking["id"] for booking in dataset["bookings"]]
+    import_job_ids = [job["id"] for job in dataset["import_jobs"]]
+    counter = itertools.count()
+    # Each background upload adds a unique row, so no upload replays an earlier fingerprint
+    background_rows = generate_manifest_rows(100, dataset["services"], known_customers=dataset["customers"])
+
+    def background_manifest():
+        n = next(counter)
+        return manifest_csv_bytes(background_rows + [[f"Background {n}", f"background.{n}@example.com",
+                                                      dataset["services"][0]["name"], 1, f"Background {n}"]])
+
+    def new_booking():
+        return {"customer_id": rng.choice(customer_ids), "service_id": rng.choice(service_ids), "quantity": rng.randint(1, 10)}
+
+    return [
+        ("GET /api/customers", lambda c, i: c.get("/api/customers", params={"limit": 100})),
+        ("GET /api/customers/search", lambda c, i: c.get("/api/customers/search", params={"q": rng.choice(customer_names)[:3]})),
+        ("GET /api/customers/{id}", lambda c, i: c.get(f"/api/customers/{rng.choice(customer_ids)}")),
+        ("GET /api/services", lambda c, i: c.get("/api/services")),
+        ("GET /api/services/{id}", lambda c, i: c.get(f"/api/services/{rng.choice(service_ids)}")),
+        ("GET /api/bookings", lambda c, i: c.get("/api/bookings", params={"limit": 100})),
+        ("GET /api/bookings?status", lambda c, i: c.get("/api/bookings", params={"status": "delivered", "limit": 100})),
+        ("GET /api/bookings?customer_id", lambda c, i: c.get("/api/bookings", params={"customer_id": rng.choice(customer_ids)})),
+        ("GET /api/bookings?sort", lambda c, i: c.get("/api/bookings", params={"sort": "-estimated_delivery_date", "limit": 100})),
+        ("GET /api/bookings/export", lambda c, i: c.get("/api/bookings/export", params={"status": "delivered"})),
+        ("GET /api/bookings/{id}", lambda c, i: c.get(f"/api/bookings/{rng.choice(booking_ids)}")),
+        ("POST /api/customers", lambda c, i: c.post("/api/customers", json={
+            "name": "Bench Customer", "email": f"bench.{next(counter)}@example.com"
+        })),
+        ("POST /api/services", lambda c, i: c.post("/api/services", json={
+            "name": f"Bench Service {next(counter)}", "type": "logistics", "base_price": 100.0, "estimated_delivery_days": 2
+        })),
+        ("POST /api/bookings", lambda c, i: c.post("/api/bookings", json=new_booking())),
+        ("POST /api/bookings/batch", lambda c, i: c.post("/api/bookings/batch", json=[new_booking() for _ in range(100)])),
+        ("POST /api/quotes", lambda c, i: c.post("/api/quotes", json=[
+            {"service_id": rng.choice(service_ids), "quantity": rng.randint(1, 500), "customer_id": rng.choice(customer_ids)}
+            for _ in range(1000)
+        ])),
+        ("PUT /api/bookings/{id}", lambda c, i: c.put(f"/api/bookings/{rng.choice(booking_ids)}", json={"notes": f"bench {i}"})),
+        ("POST /api/bookings/batch/status", lambda c, i: c.post("/api/bookings/batch/status", json=[
+            {"booking_id": booking_id, "status": "in_progress"} for booking_id in rng.sample(booking_ids, 100)
+        ])),
+        ("GET /api/analytics/overview", lambda c, i: c.get("/api/analytics/overview")),
+        ("GET /api/analytics/delivery-performance", lambda c, i: c.get("/api/analytics/delivery-performance")),
+        ("GET /api/analytics/timeseries", lambda c, i: c.get("/api/analytics/timeseries", params={"bucket": "week"})),
+        ("GET /api/bookings/stream", lambda c, i: open_booking_stream()),
+        ("PUT /api/services/{id}/pricing", lambda c, i: c.put(f"/api/services/{rng.choice(service_ids)}/pricing", json={
+            "tiers": [{"min_quantity": 10, "unit_price": 90.0}, {"min_quantity": 100, "unit_price": 75.0}],
+            "customer_discounts": [{"customer_id": customer_id, "percent": 5} for customer_id in rng.sample(customer_ids, 10)]
+        })),
+        ("POST /api/upload/bookings?background", lambda c, i: run_background_upload(c, background_manifest())),
+        ("GET /api/upload/jobs/{id}", lambda c, i: c.get(f"/api/upload/jobs/{rng.choice(import_job_ids)}")),
+        ("GET /api/admin/holidays", lambda c, i: c.get("/api/admin/holidays")),
+        ("PUT /api/admin/holidays", lambda c, i: c.put("/api/admin/holidays", json={
+            "day": (date(2030, 1, 1) + timedelta(days=next(counter) % 3650)).isoformat(), "name": "Bench holiday"
+        })),
+        ("GET /api/admin/indexes", lambda c, i: c.get("/api/admin/indexes")),
+        ("POST /api/admin/rollups/rebuild", lambda c, i: c.post("/api/admin/rollups/rebuild")),
+        ("GET /api/metrics", lambda c, i: c.get("/api/metrics")),
+    ]
+
+
+async def run_upload(client, db, filename, content, rows, repeats):
+    """Rows per second for POST /api/upload/bookings with one manifest"""
+    timings = []
+    result = None
+    error = None
+    for _ in range(repeats):
+        # Forget the upload fingerprint so each repeat imports the file instead of replaying its result
+        await db.import_fingerprints.delete_many({})
+        started = time.perf_counter()
+        try:
+            response = await client.post("/api/upload/bookings", files={"file": (filename, content)})
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"[:200]
+            break
+        elapsed = time.perf_counter() - started
+        if response.status_code >= 400:
+            error = f"HTTP {response.status_code}: {response.text[:200]}"
+            break
+        timings.append(elapsed)
+        result = response.json()
+    best = min(timings) if timings else None
+    return {
+        "rows": rows,
+        "repeats": len(timings),
+        "best_seconds": best,
+        "rows_per_second": round(rows / best, 1) if best else None,
+        "successful_imports": result and result["successful_imports"],
+        "failed_imports": result and result["failed_imports"],
+        "error": error,
+    }
+
+
+def format_endpoint(name, stats):
+    if stats["p50_ms"] is None:
+        return f"{name:45s} failed: {stats['first_error']}"
+    return (f"{name:45s} p50={stats['p50_ms']:8.2f}ms p95={stats['p95_ms']:8.2f}ms "
+            f"p99={stats['p99_ms']:8.2f}ms {stats['throughput_rps']:8.1f} req/s errors={stats['errors']}")
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+            cwd=Path(__file__).resolve().parent, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+async def run(args):
+    import httpx
+    import server
+    from datagen import generate_dataset, generate_manifest_rows, manifest_csv_bytes, manifest_xlsx_bytes
+
+    if args.in_memory:
+        from mongomock_motor import AsyncMongoMockClient
+        server.client = AsyncMongoMockClient(tz_aware=True)
+        server.db = server.client[args.db_name]
+
+    db = server.db
+    for name in await db.list_collection_names():
+        await db.drop_collection(name)
+
+    dataset = generate_dataset(args.customers, args.services, args.bookings, seed=args.seed)
+    for name, docs in dataset.items():
+        for start in range(0, len(docs), 5000):
+            await db[name].insert_many([dict(doc) for doc in docs[start:start + 5000]])
+    await server.app.router.startup()
+
+    rng = random.Random(args.seed)
+    results = {"endpoints": {}, "skipped": {}, "uploads": {}}
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        for name, make_request in build_endpoints(dataset, rng):
+            if args.only and args.only not in name:
+                continue
+            if args.in_memory and name in IN_MEMORY_UNSUPPORTED:
+                results["skipped"][name] = IN_MEMORY_UNSUPPORTED[name]
+                print(f"{name:45s} skipped: {IN_MEMORY_UNSUPPORTED[name]}")
+                continue
+            # Warm caches and connection pools before measuring
+            await run_endpoint(client, make_request, min(5, args.iterations), 1)
+            stats = results["endpoints"][name] = await run_endpoint(client, make_request, args.iterations, args.concurrency)
+            print(format_endpoint(name, stats))
+
+        rows = generate_manifest_rows(args.upload_rows, dataset["services"], seed=args.seed, known_customers=dataset["customers"])
+        manifests = {"manifest.csv": manifest_csv_bytes(rows), "manifest.xlsx": manifest_xlsx_bytes(rows)}
+        if args.manifest_dir:
+            Path(args.manifest_dir).mkdir(parents=True, exist_ok=True)
+            for filename, content in manifests.items():
+                (Path(args.manifest_dir) / filename).write_bytes(content)
+        for filename, content in manifests.items():
+            results["uploads"][filename] = await run_upload(client, db, filename, content, len(rows), args.upload_repeats)
+            print(f"POST /api/upload/bookings {filename:14s} rows/s={results['uploads'][filename]['rows_per_second']}")
+
+    await server.app.router.shutdown()
+    return results
+
+
+def compare(current, baseline):
+    """Print p95 and rows/s changes against an earlier results file"""
+    print(f"\n{'endpoint':45s} {'base p95':>10s} {'new p95':>10s} {'change':>8s}")
+    for name, stats in current["endpoints"].items():
+        base = baseline.get("endpoints", {}).get(name)
+        if not base or not base.get("p95_ms") or not stats.get("p95_ms"):
+            continue
+        change = (stats["p95_ms"] - base["p95_ms"]) / base["p95_ms"] * 100
+        print(f"{name:45s} {base['p95_ms']:10.2f} {stats['p95_ms']:10.2f} {change:+7.1f}%")
+    for name, stats in current["uploads"].items():
+        base = baseline.get("uploads", {}).get(name)
+        if base and base.get("rows_per_second") and stats.get("rows_per_second"):
+            change = (stats["rows_per_second"] - base["rows_per_second"]) / base["rows_per_second"] * 100
+            print(f"upload {name:38s} {base['rows_per_second']:10.1f} {stats['rows_per_second']:10.1f} {change:+7.1f}% rows/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the supply chain API against a local MongoDB")
+    parser.add_argument("--mongo-url", default=os.environ.get("BENCH_MONGO_URL", "mongodb://localhost:27017"))
+    parser.add_argument("--db-name", default="supply_chain_benchmark")
+    parser.add_argument("--in-memory", action="store_true", help="use mongomock instead of a MongoDB server")
+    parser.add_argument("--customers", type=int, default=1000)
+    parser.add_argument("--services", type=int, default=20)
+    parser.add_argument("--bookings", type=int, default=10000)
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--upload-rows", type=int, default=5000)
+    parser.add_argument("--upload-repeats", type=int, default=3)
+    parser.add_argument("--manifest-dir", help="also keep the generated CSV/XLSX manifests here")
+    parser.add_argument("--only", help="only run endpoints whose name contains this text")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    args = parser.parse_args()
+
+    # server.py reads its settings at import time, so point it at the benchmark database first
+    os.environ['MONGO_URL'] = args.mongo_url
+    os.environ['DB_NAME'] = args.db_name
+    sys.path.insert(0, str(Path(__file__).resolve().parent))
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'backend'))
+
+    results = asyncio.run(run(args))
+    results["meta"] = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "git_revision": git_revision(),
+        "python": platform.python_version(),
+        "database": "mongomock" if args.in_memory else args.mongo_url,
+        "parameters": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+    }
+    with open(args.output, 'w') as handle:
+        json.dump(results, handle, indent=2)
+    print(f"\nResults written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as handle:
+            compare(results, json.load(handle))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+"""Seeded synthetic data for the benchmarks: customers, services, bookings and upload manifests.
+
+The same seed always produces the same documents and manifests, so results from
+different releases are measured against identical data.
+
+    python benchmarks/datagen.py --rows 50000 --output-dir /tmp/manifests
+"""
+from pathlib import Path
+from datetime import datetime, timedelta, timezone
+import argparse
+import csv
+import io
+import os
+import random
+import sys
+import uuid
+
+from openpyxl import Workbook
+
+# server.py reads its settings at import time; the client it creates never connects here
+os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+os.environ.setdefault('DB_NAME', 'benchmark')
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'backend'))
+
+from server import (  # noqa: E402
+    Booking, BookingStatus, Customer, ImportJob, ImportJobStatus, Service, ServiceType, customer_document,
+    delivery_performance_fields
+)
+
+MANIFEST_COLUMNS = ['customer_name', 'customer_email', 'service_name', 'quantity', 'notes']
+
+FIRST_NAMES = ["Ava", "Liam", "Maya", "Noah", "Priya", "Omar", "Lena", "Kenji", "Sofia", "Mateo"]
+LAST_NAMES = ["Johnson", "Okafor", "Schmidt", "Tanaka", "Rossi", "Silva", "Kowalski", "Nguyen"]
+COMPANIES = ["acme", "globex", "initech", "umbrella", "stark", "wayne", "tyrell", "cyberdyne"]
+
+
+def seeded_uuid(rng):
+    return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+
+def generate_customers(count, rng, now):
+    customers = []
+    for i in range(count):
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        customers.append(Customer(
+            id=seeded_uuid(rng),
+            name=f"{first} {last}",
+            email=f"{first.lower()}.{last.lower()}.{i}@{rng.choice(COMPANIES)}.com",
+            phone=f"+1-555-{rng.randint(0, 9999):04d}",
+            created_at=now - timedelta(days=rng.randint(0, 365), seconds=rng.randint(0, 86399))
+        ))
+    return customers
+
+
+def generate_services(count, rng, now):
+    services = []
+    for i in range(count):
+        service_type = rng.choice(list(ServiceType))
+        services.append(Service(
+            id=seeded_uuid(rng),
+            name=f"{service_type.value.title()} Service {i + 1}",
+            type=service_type,
+            base_price=round(rng.uniform(50, 2500), 2),
+            estimated_delivery_days=rng.randint(1, 14),
+            created_at=now - timedelta(days=rng.randint(365, 730))
+        ))
+    return services
+
+
+def generate_bookings(count, customers, services, rng, now, days=180):
+    """Bookings spread over the last `days` days with a realistic mix of statuses"""
+    statuses = [BookingStatus.PENDING, BookingStatus.CONFIRMED, BookingStatus.IN_PROGRESS,
+                BookingStatus.DELIVERED, BookingStatus.CANCELLED]
+    weights = [15, 15, 20, 45, 5]
+    bookings = []
+    for _ in range(count):
+        service = rng.choice(services)
+        quantity = rng.randint(1, 20)
+        created_at = (now - timedelta(days=rng.randint(0, days), seconds=rng.randint(0, 86399))).replace(microsecond=0)
+        estimated = created_at.replace(hour=0, minute=0, second=0) + timedelta(days=service.estimated_delivery_days)
+        status = rng.choices(statuses, weights)[0]
+        extra = {}
+        if status == BookingStatus.DELIVERED:
+            extra["actual_delivery_date"] = created_at + timedelta(days=service.estimated_delivery_days + rng.randint(-2, 4))
+        booking = Booking(
+            id=seeded_uuid(rng),
+            customer_id=rng.choice(customers).id,
+            service_id=service.id,
+            quantity=quantity,
+            total_price=round(service.base_price * quantity, 2),
+            status=status,
+            estimated_delivery_date=estimated,
+            created_at=created_at,
+            updated_at=created_at,
+            **extra
+        )
+        doc = booking.dict()
+        if status == BookingStatus.DELIVERED:
+            doc.update(delivery_performance_fields(created_at, estimated, extra["actual_delivery_date"]))
+        bookings.append(doc)
+    return bookings
+
+
+def generate_dataset(customers=1000, services=20, bookings=10000, seed=42, import_jobs=20):
+    """Documents ready for insert_many, keyed by collection name"""
+    # Each entity draws from its own seeded generator, so the services (and the manifests
+    # built from them) are the same whatever number of customers or bookings is asked for
+    now = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    customer_objs = generate_customers(customers, random.Random(f"{seed}:customers"), now)
+    service_objs = generate_services(services, random.Random(f"{seed}:services"), now)
+    return {
+        "customers": [customer_document(customer) for customer in customer_objs],
+        "services": [service.dict() for service in service_objs],
+        "bookings": generate_bookings(bookings, customer_objs, service_objs, random.Random(f"{seed}:bookings"), now),
+        "import_jobs": generate_import_jobs(import_jobs, random.Random(f"{seed}:import_jobs"), now),
+    }
+
+
+def generate_import_jobs(count, rng, now):
+    """Finished background import jobs, for the job status endpoint"""
+    jobs = []
+    for i in range(count):
+        created_at = now - timedelta(days=rng.randint(0, 30), minutes=rng.randint(0, 1440))
+        records = rng.randint(100, 5000)
+        failed = rng.randint(0, records // 100)
+        jobs.append(ImportJob(
+            id=seeded_uuid(rng),
+            filename=f"manifest_{i + 1}.csv",
+            status=ImportJobStatus.COMPLETED,
+            total_records=records,
+            records_processed=records,
+            successful_imports=records - failed,
+            failed_imports=failed,
+            rows_per_second=round(rng.uniform(2000, 20000), 2),
+            errors=[f"Row {rng.randint(1, records)}: Service 'Unknown Service' not found" for _ in range(failed)],
+            created_at=created_at,
+            started_at=created_at,
+            finished_at=created_at + timedelta(seconds=rng.randint(1, 60))
+        ).dict())
+    return jobs
+
+
+def generate_manifest_rows(count, services, seed=42, known_customers=(), unknown_service_rate=0.01):
+    """Upload rows mixing existing and new customers, with a small share of unknown services"""
+    rng = random.Random(seed)
+    rows = []
+    for i in range(count):
+        if known_customers and rng.random() < 0.5:
+            customer = rng.choice(known_customers)
+            name, email = customer["name"], customer["email"]
+        else:
+            name, email = f"Manifest Customer {i}", f"manifest.{seed}.{i}@example.com"
+        service_name = rng.choice(services)["name"]
+        if rng.random() < unknown_service_rate:
+            service_name = "Unknown Service"
+        rows.append([name, email, service_name, rng.randint(1, 20), f"Consignment {i}"])
+    return rows
+
+
+def manifest_csv_bytes(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(MANIFEST_COLUMNS)
+    writer.writerows(rows)
+    return buffer.getvalue().encode()
+
+
+def manifest_xlsx_bytes(rows):
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(MANIFEST_COLUMNS)
+    for row in rows:
+        sheet.append(row)
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write seeded CSV and XLSX booking manifests")
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--services", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output-dir", default=".")
+    args = parser.parse_args()
+
+    dataset = generate_dataset(customers=0, services=args.services, bookings=0, seed=args.seed)
+    rows = generate_manifest_rows(args.rows, dataset["services"], seed=args.seed)
+    output_dir = Path(args.output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    for path, content in ((output_dir / f"manifest_{args.rows}.csv", manifest_csv_bytes(rows)),
+                          (output_dir / f"manifest_{args.rows}.xlsx", manifest_xlsx_bytes(rows))):
+        path.write_bytes(content)
+        print(path)
+
+
+if __name__ == "__main__":
+    main()
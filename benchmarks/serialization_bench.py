@@ -0,0 +1,97 @@
+"""Micro-benchmark: per-document cost of serializing a list of bookings.
+
+Compares the original read path (build a pydantic model per document, let FastAPI
+validate the list against response_model again, then encode with the standard
+JSON encoder) with the fast path used by the list endpoints (documents projected
+in Mongo, optional defaults filled in, encoded with orjson).
+
+    python benchmarks/serialization_bench.py [--documents 1000] [--repeat 20]
+"""
+from pathlib import Path
+from datetime import datetime, timedelta, timezone
+from typing import List
+import argparse
+import json
+import os
+import sys
+import time
+import uuid
+
+import orjson
+from bson import ObjectId
+from pydantic import TypeAdapter
+
+# server.py reads its settings at import time; the client it creates never connects here
+os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+os.environ.setdefault('DB_NAME', 'benchmark')
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'backend'))
+
+from server import Booking, response_defaults, response_projection  # noqa: E402
+
+
+def make_documents(count):
+    """Booking documents shaped like what Motor returns for db.bookings.find()"""
+    now = datetime.now(timezone.utc)
+    return [
+        {
+            "_id": ObjectId(),
+            "id": str(uuid.uuid4()),
+            "customer_id": str(uuid.uuid4()),
+            "service_id": str(uuid.uuid4()),
+            "quantity": i % 7 + 1,
+            "total_price": 125.5 * (i % 7 + 1),
+            "status": "pending",
+            "estimated_delivery_date": now + timedelta(days=3),
+            "actual_delivery_date": None,
+            "notes": "Pallet #%d" % i,
+            "version": 0,
+            "created_at": now,
+            "updated_at": now,
+        }
+        for i in range(count)
+    ]
+
+
+def original_path(docs):
+    adapter = TypeAdapter(List[Booking])
+    models = [Booking(**doc) for doc in docs]
+    # FastAPI validates the returned list against response_model and dumps it in JSON mode
+    validated = adapter.validate_python(models, from_attributes=True)
+    return json.dumps(adapter.dump_python(validated, mode="json")).encode()
+
+
+def fast_path(docs):
+    defaults = response_defaults(Booking)
+    return orjson.dumps([{**defaults, **doc} for doc in docs])
+
+
+def measure(func, docs, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(docs)
+        best = min(best, time.perf_counter() - started)
+    return best / len(docs) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-document serialization cost of the bookings list")
+    parser.add_argument("--documents", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    docs = make_documents(args.documents)
+    # The fast path reads projected documents, so _id never reaches the encoder
+    fields = [key for key, include in response_projection(Booking).items() if include]
+    projected = [{key: doc[key] for key in fields if key in doc} for doc in docs]
+
+    original = measure(original_path, docs, args.repeat)
+    fast = measure(fast_path, projected, args.repeat)
+    print(f"documents: {args.documents}, best of {args.repeat}")
+    print(f"original path: {original:8.2f} us/doc")
+    print(f"fast path:     {fast:8.2f} us/doc")
+    print(f"speedup:       {original / fast:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,11 @@
-import React, { useState, useEffect } from "react";
+import React, { useState, useEffect, useRef } from "react";
 import "./App.css";
 import axios from "axios";
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
+// Wait for a pause in typing before searching customers
+const CUSTOMER_SEARCH_DEBOUNCE_MS = 250;
 
 const Dashboard = () => {
   const [activeTab, setActiveTab] = useState('overview');
@@ -12,17 +14,53 @@ const Dashboard = () => {
   const [bookings, setBookings] = useState([]);
   const [analytics, setAnalytics] = useState({});
   const [deliveryPerformance, setDeliveryPerformance] = useState([]);
+  const [deliverySummary, setDeliverySummary] = useState(null);
   const [loading, setLoading] = useState(false);
 
   // Form states
   const [customerForm, setCustomerForm] = useState({ name: '', email: '', phone: '', address: '' });
   const [serviceForm, setServiceForm] = useState({ name: '', type: 'logistics', description: '', base_price: '', estimated_delivery_days: '' });
   const [bookingForm, setBookingForm] = useState({ customer_id: '', service_id: '', quantity: 1, notes: '' });
+  const [customerQuery, setCustomerQuery] = useState('');
+  const [customerMatches, setCustomerMatches] = useState([]);
   const [uploadFile, setUploadFile] = useState(null);
   const [uploadResult, setUploadResult] = useState(null);
+  // Where the server's booking events come from; with in-process events another worker's
+  // writes never reach this stream, so our own writes reload the list
+  const eventSource = useRef('local');
 
+  // Every (re)connection starts with a reset that loads the list, so events missed while
+  // disconnected are never lost; after that, apply pushed changes instead of re-downloading
   useEffect(() => {
-    fetchData();
+    let connected = false;
+    const events = new EventSource(`${API}/bookings/stream`);
+    const applyBooking = (message) => {
+      const booking = JSON.parse(message.data);
+      setBookings((current) => {
+        const index = current.findIndex((b) => b.id === booking.id);
+        if (index === -1) {
+          return [...current, booking];
+        }
+        const next = [...current];
+        next[index] = { ...current[index], ...booking };
+        return next;
+      });
+    };
+    events.addEventListener('created', applyBooking);
+    events.addEventListener('updated', applyBooking);
+    events.addEventListener('reset', (message) => {
+      connected = true;
+      eventSource.current = JSON.parse(message.data).source || 'local';
+      fetchData();
+    });
+    // Without a working stream, still load the dashboard once
+    events.onerror = () => {
+      if (!connected) {
+        connected = true;
+        fetchData();
+      }
+    };
+    return () => events.close();
   }, []);
 
   const fetchData = async () => {
@@ -30,7 +68,7 @@ const Dashboard = () => {
       const [customersRes, servicesRes, bookingsRes, analyticsRes] = await Promise.all([
         axios.get(`${API}/customers`),
         axios.get(`${API}/services`),
-        axios.get(`${API}/bookings`),
+        axios.get(`${API}/bookings`, { params: { expand: 'customer,service' } }),
         axios.get(`${API}/analytics/overview`)
       ]);
       
@@ -43,10 +81,51 @@ const Dashboard = () => {
     }
   };
 
+  // Search once typing pauses; a response that arrives after the query changed is dropped
+  useEffect(() => {
+    if (!customerQuery.trim()) {
+      setCustomerMatches([]);
+      return;
+    }
+    let stale = false;
+    const timer = setTimeout(async () => {
+      try {
+        const response = await axios.get(`${API}/customers/search`, { params: { q: customerQuery } });
+        if (!stale) {
+          setCustomerMatches(response.data);
+        }
+      } catch (error) {
+        console.error('Error searching customers:', error);
+      }
+    }, CUSTOMER_SEARCH_DEBOUNCE_MS);
+    return () => {
+      stale = true;
+      clearTimeout(timer);
+    };
+  }, [customerQuery]);
+
+  const fetchAnalytics = async () => {
+    try {
+      const response = await axios.get(`${API}/analytics/overview`);
+      setAnalytics(response.data);
+    } catch (error) {
+      console.error('Error fetching analytics:', error);
+    }
+  };
+
+  const refreshAfterBookingWrite = () => {
+    if (eventSource.current === 'local') {
+      fetchData();
+    } else {
+      fetchAnalytics();
+    }
+  };
+
   const fetchDeliveryPerformance = async () => {
     try {
       const response = await axios.get(`${API}/analytics/delivery-performance`);
-      setDeliveryPerformance(response.data);
+      setDeliveryPerformance(response.data.deliveries);
+      setDeliverySummary(response.data.summary);
     } catch (error) {
       console.error('Error fetching delivery performance:', error);
     }
@@ -93,7 +172,7 @@ const Dashboard = () => {
         quantity: parseInt(bookingForm.quantity)
       });
       setBookingForm({ customer_id: '', service_id: '', quantity: 1, notes: '' });
-      fetchData();
+      refreshAfterBookingWrite();
       alert('Booking created successfully!');
     } catch (error) {
       alert('Error creating booking: ' + error.response?.data?.detail);
@@ -134,7 +213,7 @@ const Dashboard = () => {
       }
       
       await axios.put(`${API}/bookings/${bookingId}`, updateData);
-      fetchData();
+      refreshAfterBookingWrite();
       alert('Booking status updated!');
     } catch (error) {
       alert('Error updating booking: ' + error.response?.data?.detail);
@@ -408,6 +487,13 @@ const Dashboard = () => {
             <div className="bg-white p-6 rounded-lg shadow">
               <h3 className="text-lg font-semibold text-gray-900 mb-4">Create New Booking</h3>
               <form onSubmit={handleBookingSubmit} className="grid grid-cols-1 md:grid-cols-2 gap-4">
+                <input
+                  type="text"
+                  placeholder="Search customers by name or email"
+                  value={customerQuery}
+                  onChange={(e) => setCustomerQuery(e.target.value)}
+                  className="md:col-span-2 border border-gray-300 rounded-lg px-3 py-2"
+                />
                 <select
                   value={bookingForm.customer_id}
                   onChange={(e) => setBookingForm({...bookingForm, customer_id: e.target.value})}
@@ -415,7 +501,7 @@ const Dashboard = () => {
                   required
                 >
                   <option value="">Select Customer</option>
-                  {customers.map((customer) => (
+                  {(customerQuery.trim() ? customerMatches : customers).map((customer) => (
                     <option key={customer.id} value={customer.id}>{customer.name} ({customer.email})</option>
                   ))}
                 </select>
@@ -475,8 +561,9 @@ const Dashboard = () => {
                   </thead>
                   <tbody className="bg-white divide-y divide-gray-200">
                     {bookings.map((booking) => {
-                      const customer = customers.find(c => c.id === booking.customer_id);
-                      const service = services.find(s => s.id === booking.service_id);
+                      // Bookings pushed over the event stream are not expanded
+                      const customer = booking.customer || customers.find(c => c.id === booking.customer_id);
+                      const service = booking.service || services.find(s => s.id === booking.service_id);
                       return (
                         <tr key={booking.id}>
                           <td className="px-6 py-4 whitespace-nowrap text-sm font-medium text-gray-900">
@@ -608,25 +695,25 @@ const Dashboard = () => {
                 </button>
               </div>
 
-              {deliveryPerformance.length > 0 && (
+              {deliverySummary && deliverySummary.total_deliveries > 0 && (
                 <div className="space-y-6">
                   <div className="grid grid-cols-1 md:grid-cols-3 gap-6">
                     <div className="bg-gray-50 p-4 rounded-lg">
                       <h4 className="font-medium text-gray-900">Average Delivery Time</h4>
                       <p className="text-2xl font-bold text-blue-600">
-                        {Math.round(deliveryPerformance.reduce((sum, item) => sum + item.actual_days, 0) / deliveryPerformance.length)} days
+                        {Math.round(deliverySummary.average_actual_days)} days
                       </p>
                     </div>
                     <div className="bg-gray-50 p-4 rounded-lg">
                       <h4 className="font-medium text-gray-900">On-Time Deliveries</h4>
                       <p className="text-2xl font-bold text-green-600">
-                        {Math.round((deliveryPerformance.filter(item => item.on_time).length / deliveryPerformance.length) * 100)}%
+                        {Math.round(deliverySummary.on_time_rate)}%
                       </p>
                     </div>
                     <div className="bg-gray-50 p-4 rounded-lg">
                       <h4 className="font-medium text-gray-900">Average Variance</h4>
                       <p className="text-2xl font-bold text-orange-600">
-                        {Math.round(deliveryPerformance.reduce((sum, item) => sum + item.variance_days, 0) / deliveryPerformance.length)} days
+                        {Math.round(deliverySummary.average_variance_days)} days
                       </p>
                     </div>
                   </div>
@@ -0,0 +1,52 @@
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+
+# server.py reads its Mongo settings at import time; the client connects lazily, so the tests
+# of its pure logic never need a running database, and the endpoint tests swap in mongomock
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "test_database")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+
+@pytest.fixture
+def api(monkeypatch):
+    """TestClient for the app, running against an empty in-memory database"""
+    from fastapi.testclient import TestClient
+    from mongomock_motor import AsyncMongoMockClient
+
+    import server
+
+    mock_client = AsyncMongoMockClient(tz_aware=True)
+    monkeypatch.setattr(server, "client", mock_client)
+    monkeypatch.setattr(server, "db", mock_client[os.environ["DB_NAME"]])
+    # mongomock cannot build partial indexes
+    monkeypatch.setattr(server, "INDEXES", {
+        name: [index for index in indexes if "partialFilterExpression" not in index.document]
+        for name, indexes in server.INDEXES.items()
+    })
+    # The shutdown handler stops the parser pool, so every app lifetime gets a fresh one
+    monkeypatch.setattr(server, "upload_parse_executor", ThreadPoolExecutor(max_workers=2))
+    server.service_catalog.invalidate()
+    server.delivery_calendar.invalidate()
+    with TestClient(server.app) as client:
+        yield client
+
+
+@pytest.fixture
+def make_booking(api):
+    """Create a customer and a service once, and return a function that books them"""
+    customer = api.post("/api/customers", json={"name": "Acme", "email": "ops@acme.test"}).json()
+    service = api.post("/api/services", json={
+        "name": "Freight", "type": "logistics", "base_price": 10, "estimated_delivery_days": 2
+    }).json()
+
+    def make(**fields):
+        response = api.post("/api/bookings", json={"customer_id": customer["id"], "service_id": service["id"], **fields})
+        assert response.status_code == 200, response.text
+        return response.json()
+
+    return make
@@ -0,0 +1,74 @@
+import server
+
+
+def post_batch(api, updates):
+    response = api.post("/api/bookings/batch/status", json=updates)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_batch_updates_status_and_version(api, make_booking):
+    first, second = make_booking(), make_booking()
+    result = post_batch(api, [
+        {"booking_id": first["id"], "status": "confirmed"},
+        {"booking_id": second["id"], "status": "in_progress"},
+    ])
+    assert result["successful"] == 2 and result["failed"] == 0
+    assert api.get(f"/api/bookings/{first['id']}").json()["version"] == 1
+    assert api.get(f"/api/bookings/{second['id']}").json()["status"] == "in_progress"
+    counts = api.get("/api/analytics/overview").json()["status_counts"]
+    assert counts.get("pending", 0) == 0 and counts["confirmed"] == counts["in_progress"] == 1
+
+
+def test_batch_reports_missing_and_duplicate_bookings(api, make_booking):
+    booking = make_booking()
+    result = post_batch(api, [
+        {"booking_id": booking["id"], "status": "confirmed"},
+        {"booking_id": booking["id"], "status": "cancelled"},
+        {"booking_id": "missing", "status": "confirmed"},
+    ])
+    assert result["successful"] == 1
+    assert [item["error"] for item in result["results"]] == [None, "Duplicate booking id in batch", "Booking not found"]
+    assert api.get(f"/api/bookings/{booking['id']}").json()["status"] == "confirmed"
+
+
+def test_batch_records_delivery_performance(api, make_booking):
+    booking = make_booking()
+    result = post_batch(api, [{
+        "booking_id": booking["id"], "status": "delivered", "actual_delivery_date": booking["estimated_delivery_date"]
+    }])
+    assert result["successful"] == 1
+    stored = api.portal.call(server.db.bookings.find_one, {"id": booking["id"]})
+    assert stored["status"] == "delivered"
+    assert stored["delivered_on_time"] is True
+    assert stored["delivery_variance_days"] == 0
+
+
+def test_batch_does_not_overwrite_a_concurrent_write(api, make_booking, monkeypatch):
+    raced, other = make_booking(), make_booking()
+    collection_class = type(server.db.bookings)
+    bulk_write = collection_class.bulk_write
+
+    async def racing_bulk_write(self, operations, **kwargs):
+        # Another request cancels the booking between the batch's read and its write
+        await bulk_write(self, [server.UpdateOne(
+            {"id": raced["id"]}, {"$set": {"status": "cancelled"}, "$inc": {"version": 1}}
+        )])
+        await server.increment_rollup({"status_counts.pending": -1, "status_counts.cancelled": 1})
+        return await bulk_write(self, operations, **kwargs)
+
+    monkeypatch.setattr(collection_class, "bulk_write", racing_bulk_write)
+    result = post_batch(api, [
+        {"booking_id": raced["id"], "status": "in_progress"},
+        {"booking_id": other["id"], "status": "confirmed"},
+    ])
+    monkeypatch.setattr(collection_class, "bulk_write", bulk_write)
+
+    assert result["successful"] == 1
+    assert result["results"][0]["error"] == "Booking was modified by another request"
+    assert result["results"][1]["updated"] is True
+    raced_now = api.get(f"/api/bookings/{raced['id']}").json()
+    assert raced_now["status"] == "cancelled" and raced_now["version"] == 1
+    # The rollup only counts the change that was applied
+    counts = api.get("/api/analytics/overview").json()["status_counts"]
+    assert counts == api.post("/api/admin/rollups/rebuild").json()["status_counts"]
@@ -0,0 +1,65 @@
+def test_update_bumps_version_and_etag(api, make_booking):
+    booking = make_booking()
+    response = api.put(f"/api/bookings/{booking['id']}", json={"notes": "gate 4", "version": 0})
+    assert response.status_code == 200
+    assert response.json()["version"] == 1
+    assert response.json()["notes"] == "gate 4"
+    assert response.headers["ETag"] == '"1"'
+
+
+def test_update_with_stale_body_version_is_409(api, make_booking):
+    booking = make_booking()
+    assert api.put(f"/api/bookings/{booking['id']}", json={"notes": "first", "version": 0}).status_code == 200
+    response = api.put(f"/api/bookings/{booking['id']}", json={"notes": "second", "version": 0})
+    assert response.status_code == 409
+    assert api.get(f"/api/bookings/{booking['id']}").json()["notes"] == "first"
+
+
+def test_update_with_stale_if_match_is_412(api, make_booking):
+    booking = make_booking()
+    etag = api.get(f"/api/bookings/{booking['id']}").headers["ETag"]
+    assert api.put(f"/api/bookings/{booking['id']}", json={"notes": "first"}, headers={"If-Match": etag}).status_code == 200
+    response = api.put(f"/api/bookings/{booking['id']}", json={"notes": "second"}, headers={"If-Match": etag})
+    assert response.status_code == 412
+    assert api.get(f"/api/bookings/{booking['id']}").json()["notes"] == "first"
+
+
+def test_update_with_disagreeing_body_version_and_if_match_is_400(api, make_booking):
+    booking = make_booking()
+    response = api.put(f"/api/bookings/{booking['id']}", json={"notes": "x", "version": 1}, headers={"If-Match": '"0"'})
+    assert response.status_code == 400
+    assert api.get(f"/api/bookings/{booking['id']}").json()["version"] == 0
+
+
+def test_update_with_if_match_star_skips_the_version_check(api, make_booking):
+    booking = make_booking()
+    api.put(f"/api/bookings/{booking['id']}", json={"notes": "first"})
+    response = api.put(f"/api/bookings/{booking['id']}", json={"notes": "second"}, headers={"If-Match": "*"})
+    assert response.status_code == 200
+    assert response.json()["version"] == 2
+
+
+def test_update_accepts_weak_if_match(api, make_booking):
+    booking = make_booking()
+    response = api.put(f"/api/bookings/{booking['id']}", json={"notes": "x"}, headers={"If-Match": 'W/"0"'})
+    assert response.status_code == 200
+
+
+def test_update_with_malformed_if_match_is_400(api, make_booking):
+    booking = make_booking()
+    assert api.put(f"/api/bookings/{booking['id']}", json={"notes": "x"}, headers={"If-Match": "abc"}).status_code == 400
+
+
+def test_update_of_legacy_booking_without_version(api, make_booking):
+    import server
+
+    booking = make_booking()
+    api.portal.call(server.db.bookings.update_one, {"id": booking["id"]}, {"$unset": {"version": ""}})
+    response = api.put(f"/api/bookings/{booking['id']}", json={"notes": "x", "version": 0})
+    assert response.status_code == 200
+    assert response.json()["version"] == 1
+
+
+def test_update_of_missing_booking_is_404(api):
+    assert api.put("/api/bookings/missing", json={"notes": "x", "version": 0}).status_code == 404
+    assert api.put("/api/bookings/missing", json={"notes": "x"}, headers={"If-Match": '"0"'}).status_code == 404
@@ -0,0 +1,34 @@
+from datetime import date
+
+import numpy as np
+
+from server import DeliveryCalendar
+
+
+# DeliveryCalendar.add_working_days
+
+def test_add_working_days_skips_weekends():
+    calendar = DeliveryCalendar("Mon Tue Wed Thu Fri", 300)
+    # Thursday 2024-01-04 plus two working days lands on Monday
+    assert calendar.add_working_days(date(2024, 1, 4), 2).astype(date) == date(2024, 1, 8)
+
+
+def test_add_working_days_rolls_weekend_start_forward():
+    calendar = DeliveryCalendar("Mon Tue Wed Thu Fri", 300)
+    # Saturday rolls to Monday before counting
+    assert calendar.add_working_days(date(2024, 1, 6), 0).astype(date) == date(2024, 1, 8)
+    assert calendar.add_working_days(date(2024, 1, 6), 1).astype(date) == date(2024, 1, 9)
+
+
+def test_add_working_days_skips_holidays():
+    calendar = DeliveryCalendar("Mon Tue Wed Thu Fri", 300)
+    calendar.busdaycal = np.busdaycalendar(weekmask="Mon Tue Wed Thu Fri", holidays=[date(2024, 12, 25), date(2024, 12, 26)])
+    assert calendar.add_working_days(date(2024, 12, 24), 1).astype(date) == date(2024, 12, 27)
+    # A holiday start rolls forward like a weekend
+    assert calendar.add_working_days(date(2024, 12, 25), 0).astype(date) == date(2024, 12, 27)
+
+
+def test_add_working_days_vectorized():
+    calendar = DeliveryCalendar("Mon Tue Wed Thu Fri", 300)
+    dates = calendar.add_working_days(date(2024, 1, 1), [0, 1, 5])
+    assert [day.astype(date) for day in dates] == [date(2024, 1, 1), date(2024, 1, 2), date(2024, 1, 8)]
@@ -0,0 +1,54 @@
+import pytest
+
+
+def revalidate(api, path, etag):
+    return api.get(path, headers={"If-None-Match": etag})
+
+
+@pytest.mark.parametrize("path", ["/api/customers", "/api/services", "/api/bookings", "/api/analytics/overview"])
+def test_unchanged_collection_is_304(api, make_booking, path):
+    make_booking()
+    first = api.get(path)
+    assert first.status_code == 200
+    response = revalidate(api, path, first.headers["ETag"])
+    assert response.status_code == 304
+    assert response.headers["ETag"] == first.headers["ETag"]
+    assert response.content == b""
+
+
+def test_detail_endpoints_are_304(api, make_booking):
+    booking = make_booking()
+    for path in (
+        f"/api/customers/{booking['customer_id']}",
+        f"/api/services/{booking['service_id']}",
+        f"/api/bookings/{booking['id']}",
+    ):
+        etag = api.get(path).headers["ETag"]
+        assert revalidate(api, path, etag).status_code == 304
+
+
+def test_weak_and_listed_etags_match(api, make_booking):
+    make_booking()
+    etag = api.get("/api/bookings").headers["ETag"]
+    assert revalidate(api, "/api/bookings", f'"stale", W/{etag}').status_code == 304
+
+
+def test_write_changes_the_etag(api, make_booking):
+    booking = make_booking()
+    bookings_etag = api.get("/api/bookings").headers["ETag"]
+    booking_etag = api.get(f"/api/bookings/{booking['id']}").headers["ETag"]
+    customers_etag = api.get("/api/customers").headers["ETag"]
+
+    api.put(f"/api/bookings/{booking['id']}", json={"notes": "changed"})
+    assert revalidate(api, "/api/bookings", bookings_etag).status_code == 200
+    assert revalidate(api, f"/api/bookings/{booking['id']}", booking_etag).status_code == 200
+    # Other collections keep their ETag
+    assert revalidate(api, "/api/customers", customers_etag).status_code == 304
+
+
+def test_expanded_list_etag_follows_the_expanded_collection(api, make_booking):
+    make_booking()
+    path = "/api/bookings?expand=customer"
+    etag = api.get(path).headers["ETag"]
+    api.post("/api/customers", json={"name": "Other", "email": "other@x.test"})
+    assert revalidate(api, path, etag).status_code == 200
@@ -0,0 +1,96 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import server
+
+HEADER = "customer_name,customer_email,service_name,external_ref\n"
+
+
+@pytest.fixture
+def freight(api):
+    return api.post("/api/services", json={
+        "name": "Freight", "type": "logistics", "base_price": 10, "estimated_delivery_days": 2
+    }).json()
+
+
+def upload(api, content, filename="manifest.csv"):
+    return api.post("/api/upload/bookings", files={"file": (filename, content.encode(), "text/csv")})
+
+
+def stored_refs(api):
+    return sorted(booking["external_ref"] for booking in api.get("/api/bookings").json())
+
+
+def test_reupload_returns_the_stored_result(api, freight):
+    content = HEADER + "a,a@x.test,Freight,R1\nb,b@x.test,Freight,R2\n"
+    first = upload(api, content)
+    assert first.status_code == 200
+    assert first.json()["successful_imports"] == 2
+    again = upload(api, content, "renamed.csv")
+    assert again.json() == first.json()
+    assert stored_refs(api) == ["R1", "R2"]
+
+
+def test_rows_with_known_external_refs_are_skipped(api, freight):
+    upload(api, HEADER + "a,a@x.test,Freight,R1\n")
+    result = upload(api, HEADER + "a,a@x.test,Freight,R1\nb,b@x.test,Freight,R2\n").json()
+    assert result["successful_imports"] == 1
+    assert result["skipped_duplicates"] == 1
+    assert stored_refs(api) == ["R1", "R2"]
+
+
+def test_repeated_external_ref_keeps_the_first_valid_row(api, freight):
+    # The first R5 row fails validation, so the second one is the row that gets imported
+    content = HEADER + "a,a@x.test,Typo,R5\nb,b@x.test,Freight,R5\nc,c@x.test,Freight,R5\n"
+    result = upload(api, content).json()
+    assert (result["successful_imports"], result["failed_imports"], result["skipped_duplicates"]) == (1, 1, 1)
+    bookings = api.get("/api/bookings").json()
+    assert [booking["external_ref"] for booking in bookings] == ["R5"]
+
+
+def test_upload_of_a_file_being_imported_is_409(api, freight):
+    content = HEADER + "a,a@x.test,Freight,R1\n"
+    claimed = api.portal.call(
+        server.claim_import_fingerprint, server.upload_fingerprint(content.encode()), "manifest.csv", "other-claim"
+    )
+    assert claimed is None
+    assert upload(api, content).status_code == 409
+    assert stored_refs(api) == []
+
+
+def test_expired_claim_is_taken_over(api, freight):
+    content = HEADER + "a,a@x.test,Freight,R1\n"
+    fingerprint = server.upload_fingerprint(content.encode())
+    stale = datetime.now(timezone.utc) - timedelta(seconds=server.IMPORT_CLAIM_LEASE_SECONDS + 60)
+    api.portal.call(server.db.import_fingerprints.insert_one, {
+        "fingerprint": fingerprint, "result": None, "filename": "manifest.csv",
+        "claim_id": "crashed", "job_id": None, "claimed_at": stale, "created_at": stale
+    })
+    response = upload(api, content)
+    assert response.status_code == 200
+    assert response.json()["successful_imports"] == 1
+    record = api.portal.call(server.db.import_fingerprints.find_one, {"fingerprint": fingerprint})
+    assert record["claim_id"] != "crashed" and record["result"]["successful_imports"] == 1
+
+
+def test_failed_import_releases_the_fingerprint(api, freight, monkeypatch):
+    content = HEADER + "a,a@x.test,Freight,R1\n"
+    import_bookings = server.import_bookings
+
+    async def broken_import(*args):
+        raise RuntimeError("database went away")
+
+    monkeypatch.setattr(server, "import_bookings", broken_import)
+    assert upload(api, content).status_code == 500
+    monkeypatch.setattr(server, "import_bookings", import_bookings)
+    assert upload(api, content).json()["successful_imports"] == 1
+
+
+def test_stored_result_caps_the_error_list(api, freight, monkeypatch):
+    monkeypatch.setattr(server, "MAX_STORED_IMPORT_ERRORS", 2)
+    content = HEADER + "".join(f"c{n},c{n}@x.test,Typo,E{n}\n" for n in range(5))
+    first = upload(api, content).json()
+    assert first["failed_imports"] == 5 and len(first["errors"]) == 5
+    replay = upload(api, content).json()
+    assert replay["errors"] == first["errors"][:2] + ["... and 3 more errors"]
@@ -0,0 +1,51 @@
+from datetime import datetime, timezone
+
+import pytest
+from fastapi import HTTPException
+
+from server import decode_cursor, encode_cursor
+
+
+# encode_cursor / decode_cursor
+
+CURSOR_DOC = {"id": "b-1", "created_at": datetime(2024, 1, 2, 3, 4, 5, 678000, tzinfo=timezone.utc)}
+
+
+def test_cursor_round_trip_ascending():
+    token = encode_cursor(CURSOR_DOC)
+    assert decode_cursor(token) == {
+        "$or": [
+            {"created_at": {"$gt": CURSOR_DOC["created_at"]}},
+            {"created_at": CURSOR_DOC["created_at"], "id": {"$gt": "b-1"}},
+        ]
+    }
+
+
+def test_cursor_round_trip_descending():
+    doc = {"id": "b-2", "estimated_delivery_date": datetime(2024, 5, 6, tzinfo=timezone.utc)}
+    token = encode_cursor(doc, "estimated_delivery_date")
+    assert decode_cursor(token, "estimated_delivery_date", descending=True) == {
+        "$or": [
+            {"estimated_delivery_date": {"$lt": doc["estimated_delivery_date"]}},
+            {"estimated_delivery_date": doc["estimated_delivery_date"], "id": {"$lt": "b-2"}},
+        ]
+    }
+
+
+def test_cursor_token_is_url_safe():
+    token = encode_cursor(CURSOR_DOC)
+    assert "=" not in token and "+" not in token and "/" not in token
+
+
+@pytest.mark.parametrize("token", [
+    "",
+    "not-base64!",
+    "bm90IGpzb24",  # "not json"
+    "WzFd",  # [1]
+    "WyJub3QgYSBkYXRlIiwgImlkIl0",  # ["not a date", "id"]
+    "WyIyMDI0LTAxLTAxVDAwOjAwOjAwKzAwOjAwIiwgMV0",  # ["2024-01-01T00:00:00+00:00", 1]
+])
+def test_decode_cursor_rejects_malformed_tokens(token):
+    with pytest.raises(HTTPException) as excinfo:
+        decode_cursor(token)
+    assert excinfo.value.status_code == 400
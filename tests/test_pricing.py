@@ -0,0 +1,83 @@
+import numpy as np
+
+from server import (
+    CustomerDiscount,
+    PricingEngine,
+    PricingRules,
+    PricingTier,
+    Service,
+)
+
+
+def make_service(base_price=10.0, tiers=(), discounts=()):
+    return Service(
+        name="Freight",
+        type="logistics",
+        base_price=base_price,
+        estimated_delivery_days=2,
+        pricing=PricingRules(
+            tiers=[PricingTier(min_quantity=q, unit_price=p) for q, p in tiers],
+            customer_discounts=[CustomerDiscount(customer_id=c, percent=p) for c, p in discounts],
+        ),
+    )
+
+
+# PricingEngine.price
+
+def test_price_uses_base_price_below_first_tier():
+    service = make_service(tiers=[(10, 8.0), (100, 5.0)])
+    unit_prices, discounts, totals = PricingEngine().price({service.id: service}, [service.id], [9], [None])
+    assert unit_prices.tolist() == [10.0]
+    assert discounts.tolist() == [0.0]
+    assert totals.tolist() == [90.0]
+
+
+def test_price_tier_boundaries_are_inclusive():
+    service = make_service(tiers=[(100, 5.0), (10, 8.0)])
+    quantities = [1, 9, 10, 11, 99, 100, 1000]
+    unit_prices, _, totals = PricingEngine().price(
+        {service.id: service}, [service.id] * len(quantities), quantities, [None] * len(quantities)
+    )
+    assert unit_prices.tolist() == [10.0, 10.0, 8.0, 8.0, 8.0, 5.0, 5.0]
+    assert totals.tolist() == [10.0, 90.0, 80.0, 88.0, 792.0, 500.0, 5000.0]
+
+
+def test_price_tier_starting_at_one_overrides_base_price():
+    service = make_service(base_price=10.0, tiers=[(1, 7.0)])
+    unit_prices, _, _ = PricingEngine().price({service.id: service}, [service.id, service.id], [1, 5], [None, None])
+    assert unit_prices.tolist() == [7.0, 7.0]
+
+
+def test_price_applies_customer_discount():
+    service = make_service(tiers=[(10, 8.0)], discounts=[("vip", 25)])
+    unit_prices, discounts, totals = PricingEngine().price(
+        {service.id: service}, [service.id, service.id], [10, 10], ["vip", "regular"]
+    )
+    assert unit_prices.tolist() == [8.0, 8.0]
+    assert discounts.tolist() == [25.0, 0.0]
+    assert totals.tolist() == [60.0, 80.0]
+
+
+def test_price_rounds_totals_to_cents():
+    service = make_service(base_price=0.1, discounts=[("c", 33.3333)])
+    _, _, totals = PricingEngine().price({service.id: service}, [service.id], [3], ["c"])
+    assert totals.tolist() == [0.2]
+
+
+def test_price_unknown_service_is_nan():
+    service = make_service()
+    unit_prices, discounts, totals = PricingEngine().price(
+        {service.id: service}, ["missing", service.id], [2, 2], [None, None]
+    )
+    assert np.isnan(unit_prices[0]) and np.isnan(totals[0])
+    assert discounts[0] == 0
+    assert totals[1] == 20.0
+
+
+def test_price_empty_input():
+    unit_prices, discounts, totals = PricingEngine().price({}, [], [], [])
+    assert len(unit_prices) == len(discounts) == len(totals) == 0
+
+
+def test_price_bookings_empty():
+    assert PricingEngine().price_bookings([]) == []
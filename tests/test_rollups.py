@@ -0,0 +1,46 @@
+from server import booking_rollup_delta
+
+
+# booking_rollup_delta
+
+def nonzero(delta):
+    return {key: value for key, value in delta.items() if value}
+
+
+def test_rollup_delta_status_change():
+    before = {"status": "pending"}
+    after = {"status": "confirmed"}
+    assert nonzero(booking_rollup_delta(before, after)) == {"status_counts.pending": -1, "status_counts.confirmed": 1}
+
+
+def test_rollup_delta_delivered_on_time():
+    before = {"status": "in_progress"}
+    after = {"status": "delivered", "delivered_on_time": True}
+    assert nonzero(booking_rollup_delta(before, after)) == {
+        "status_counts.in_progress": -1,
+        "status_counts.delivered": 1,
+        "total_delivered": 1,
+        "on_time_deliveries": 1,
+    }
+
+
+def test_rollup_delta_late_delivery_becomes_on_time():
+    before = {"status": "delivered", "delivered_on_time": False}
+    after = {"status": "delivered", "delivered_on_time": True}
+    assert nonzero(booking_rollup_delta(before, after)) == {"on_time_deliveries": 1}
+
+
+def test_rollup_delta_delivered_without_performance_fields():
+    before = {"status": "delivered", "delivered_on_time": True}
+    after = {"status": "cancelled"}
+    assert nonzero(booking_rollup_delta(before, after)) == {
+        "status_counts.delivered": -1,
+        "status_counts.cancelled": 1,
+        "total_delivered": -1,
+        "on_time_deliveries": -1,
+    }
+
+
+def test_rollup_delta_unchanged_booking_is_all_zero():
+    booking = {"status": "delivered", "delivered_on_time": False}
+    assert nonzero(booking_rollup_delta(booking, dict(booking))) == {}